@@ -68,7 +68,8 @@ def rgb2gray(rgb):
   return np.dot(rgb[...,:3], [0.299, 0.587, 0.144])
 
 
-def hog_feature(im):
+def hog_feature(im, orientations=9, pixels_per_cell=(8, 8),
+                cells_per_block=None, block_norm='L2-Hys', eps=1e-5):
   """Compute Histogram of Gradient (HOG) feature for an image
 
        Modified from skimage.feature.hog
@@ -78,8 +79,22 @@ def hog_feature(im):
        Histograms of Oriented Gradients for Human Detection
        Navneet Dalal and Bill Triggs, CVPR 2005
 
+     Cell histograms are accumulated with a single bincount over
+     (cell, orientation) ids, so only the cell sums are ever computed; the
+     cost does not depend on the cell size or the number of orientations.
+     With the default arguments the output matches the original 8x8 / 9-bin
+     feature (average gradient magnitude per cell and orientation).
+
     Parameters:
       im : an input grayscale or rgb image
+      orientations : number of gradient bins over [0, 180) degrees
+      pixels_per_cell : (rows, columns) size of a cell in pixels
+      cells_per_block : (rows, columns) number of cells per normalization
+        block, or None to return the raw cell histograms; must fit into the
+        grid of cells
+      block_norm : one of 'L1', 'L1-sqrt', 'L2' or 'L2-Hys'; only used when
+        cells_per_block is given
+      eps : constant for numeric stability of the block normalization
 
     Returns:
       feat: Histogram of Gradient (HOG) feature
@@ -90,11 +105,10 @@ def hog_feature(im):
   if im.ndim == 3:
     image = rgb2gray(im)
   else:
-    image = np.at_least_2d(im)
+    image = np.atleast_2d(im)
 
-  sx, sy = image.shape # image size
-  orientations = 9 # number of gradient bins
-  cx, cy = (8, 8) # pixels per cell
+  n_rows, n_cols = image.shape # image size
+  ppr, ppc = pixels_per_cell # pixels per cell along rows and columns
 
   gx = np.zeros(image.shape)
   gy = np.zeros(image.shape)
@@ -103,23 +117,63 @@ def hog_feature(im):
   grad_mag = np.sqrt(gx ** 2 + gy ** 2) # gradient magnitude
   grad_ori = np.arctan2(gy, (gx + 1e-15)) * (180 / np.pi) + 90 # gradient orientation
 
-  n_cellsx = int(np.floor(sx / cx))  # number of cells in x
-  n_cellsy = int(np.floor(sy / cy))  # number of cells in y
-  # compute orientations integral images
-  orientation_histogram = np.zeros((n_cellsx, n_cellsy, orientations))
-  for i in range(orientations):
-    # create new integral image for this orientation
-    # isolate orientations in this range
-    temp_ori = np.where(grad_ori < 180 / orientations * (i + 1),
-                        grad_ori, 0)
-    temp_ori = np.where(grad_ori >= 180 / orientations * i,
-                        temp_ori, 0)
-    # select magnitudes for those orientations
-    cond2 = temp_ori > 0
-    temp_mag = np.where(cond2, grad_mag, 0)
-    orientation_histogram[:,:,i] = uniform_filter(temp_mag, size=(cx, cy))[cx//2::cx, cy//2::cy].T
-
-  return orientation_histogram.ravel()
+  n_cells_r = n_rows // ppr  # number of cells along the rows
+  n_cells_c = n_cols // ppc  # number of cells along the columns
+  if cells_per_block is not None:
+    br, bc = cells_per_block
+    if not (1 <= br <= n_cells_r and 1 <= bc <= n_cells_c):
+      raise ValueError('cells_per_block %s does not fit the %d x %d cell grid'
+                       % (tuple(cells_per_block), n_cells_r, n_cells_c))
+  # only pixels belonging to a full cell contribute
+  grad_mag = grad_mag[:n_cells_r * ppr, :n_cells_c * ppc]
+  grad_ori = grad_ori[:n_cells_r * ppr, :n_cells_c * ppc]
+
+  # orientation bin of every pixel; bin i holds lo_i <= ori < hi_i and, as in
+  # the original implementation, orientations <= 0 or >= 180 are dropped
+  bin_edges = 180 / orientations * np.arange(orientations + 1)
+  ori_bin = np.digitize(grad_ori, bin_edges) - 1
+  valid = (grad_ori > 0) & (ori_bin >= 0) & (ori_bin < orientations)
+
+  # cell id of every pixel, laid out so the histogram comes out as
+  # (n_cells_c, n_cells_r, orientations) like the transposed filter output
+  # of the original implementation
+  rows = np.arange(n_cells_r * ppr) // ppr
+  cols = np.arange(n_cells_c * ppc) // ppc
+  cell_id = cols[np.newaxis, :] * n_cells_r + rows[:, np.newaxis]
+
+  ids = cell_id[valid] * orientations + ori_bin[valid]
+  orientation_histogram = np.bincount(ids, weights=grad_mag[valid],
+                                      minlength=n_cells_r * n_cells_c * orientations)
+  orientation_histogram = orientation_histogram.reshape(
+      n_cells_c, n_cells_r, orientations) / (ppr * ppc)
+
+  if cells_per_block is None:
+    return orientation_histogram.ravel()
+
+  # group neighbouring cells into overlapping blocks without copying
+  s0, s1, s2 = orientation_histogram.strides
+  blocks = np.lib.stride_tricks.as_strided(
+      orientation_histogram,
+      shape=(n_cells_c - bc + 1, n_cells_r - br + 1, bc, br, orientations),
+      strides=(s0, s1, s0, s1, s2))
+
+  if block_norm == 'L1':
+    norm = np.sum(np.abs(blocks), axis=(2, 3, 4), keepdims=True)
+    blocks = blocks / (norm + eps)
+  elif block_norm == 'L1-sqrt':
+    norm = np.sum(np.abs(blocks), axis=(2, 3, 4), keepdims=True)
+    blocks = np.sqrt(blocks / (norm + eps))
+  elif block_norm in ('L2', 'L2-Hys'):
+    norm = np.sqrt(np.sum(blocks ** 2, axis=(2, 3, 4), keepdims=True) + eps ** 2)
+    blocks = blocks / norm
+    if block_norm == 'L2-Hys':
+      blocks = np.minimum(blocks, 0.2)
+      norm = np.sqrt(np.sum(blocks ** 2, axis=(2, 3, 4), keepdims=True) + eps ** 2)
+      blocks = blocks / norm
+  else:
+    raise ValueError('Invalid block_norm "%s"' % block_norm)
+
+  return blocks.ravel()
 
 
 def color_histogram_hsv(im, nbin=10, xmin=0, xmax=255, normalized=True):
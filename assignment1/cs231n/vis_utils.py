@@ -1,7 +1,53 @@
 from math import sqrt, ceil
+import struct
+import zlib
+
 import numpy as np
 
-def visualize_grid(Xs, ubound=255.0, padding=1):
+def _tile_strip(tiles, grid_size, padding, fill):
+  """
+  Lay out up to grid_size images of shape (H, W, C) side by side, followed
+  by padding columns of fill after every image. Returns an array of shape
+  (H, grid_size * (W + padding), C).
+  """
+  n, H, W, C = tiles.shape
+  strip = np.empty((H, grid_size, W + padding, C), dtype=tiles.dtype)
+  strip[:, n:] = fill
+  strip[:, :n, W:] = fill
+  strip[:, :n, :W] = tiles.transpose(1, 0, 2, 3)
+  return strip.reshape(H, grid_size * (W + padding), C)
+
+
+def iter_grid_strips(Xs, ubound=255.0, padding=1):
+  """
+  Generate the rows of the visualize_grid image one strip at a time, so
+  grids of any size can be produced with the memory of a single row of
+  tiles. Every tile is scaled to [0, ubound] by its own min and max.
+
+  Yields tuples (y0, strip) where strip holds the image rows starting at
+  row y0: one row of tiles followed by its padding rows (except for the
+  last row of tiles).
+  """
+  (N, H, W, C) = Xs.shape
+  grid_size = int(ceil(sqrt(N)))
+  grid_width = W * grid_size + padding * (grid_size - 1)
+  for y in range(grid_size):
+    tiles = np.asarray(Xs[y * grid_size:(y + 1) * grid_size],
+                       dtype=np.float64)
+    n = tiles.shape[0]
+    if n > 0:
+      low = tiles.reshape(n, -1).min(axis=1)[:, None, None, None]
+      high = tiles.reshape(n, -1).max(axis=1)[:, None, None, None]
+      scale = ubound / np.where(high > low, high - low, 1.0)
+      tiles = (tiles - low) * scale
+    strip = _tile_strip(tiles, grid_size, padding, 0.0)[:, :grid_width]
+    if y < grid_size - 1 and padding > 0:
+      strip = np.concatenate(
+        [strip, np.zeros((padding, grid_width, C))], axis=0)
+    yield y * (H + padding), strip
+
+
+def visualize_grid(Xs, ubound=255.0, padding=1, out=None):
   """
   Reshape a 4D tensor of image data to a grid for easy visualization.
 
@@ -9,50 +55,76 @@ def visualize_grid(Xs, ubound=255.0, padding=1):
   - Xs: Data of shape (N, H, W, C)
   - ubound: Output grid will have values scaled to the range [0, ubound]
   - padding: The number of blank pixels between elements of the grid
+  - out: Optional array (for example a np.memmap) of shape
+    (grid_height, grid_width, C) to write the grid into, one row of tiles
+    at a time
   """
   (N, H, W, C) = Xs.shape
   grid_size = int(ceil(sqrt(N)))
   grid_height = H * grid_size + padding * (grid_size - 1)
   grid_width = W * grid_size + padding * (grid_size - 1)
-  grid = np.zeros((grid_height, grid_width, C))
-  next_idx = 0
-  y0, y1 = 0, H
-  for y in range(grid_size):
-    x0, x1 = 0, W
-    for x in range(grid_size):
-      if next_idx < N:
-        img = Xs[next_idx]
-        low, high = np.min(img), np.max(img)
-        grid[y0:y1, x0:x1] = ubound * (img - low) / (high - low)
-        # grid[y0:y1, x0:x1] = Xs[next_idx]
-        next_idx += 1
-      x0 += W + padding
-      x1 += W + padding
-    y0 += H + padding
-    y1 += H + padding
-  # grid_max = np.max(grid)
-  # grid_min = np.min(grid)
-  # grid = ubound * (grid - grid_min) / (grid_max - grid_min)
-  return grid
-
-def vis_grid(Xs):
+  if out is None:
+    out = np.zeros((grid_height, grid_width, C))
+  for y0, strip in iter_grid_strips(Xs, ubound=ubound, padding=padding):
+    out[y0:y0 + strip.shape[0]] = strip
+  return out
+
+
+def save_grid_png(filename, Xs, padding=1):
+  """
+  Write the visualize_grid image of Xs to an 8-bit PNG file, compressing
+  one row of tiles at a time so the full grid is never held in memory.
+
+  Inputs:
+  - filename: Path of the PNG file.
+  - Xs: Data of shape (N, H, W, C) with C equal to 1, 3 or 4.
+  - padding: The number of blank pixels between elements of the grid
+  """
+  (N, H, W, C) = Xs.shape
+  color_types = {1: 0, 3: 2, 4: 6}
+  if C not in color_types:
+    raise ValueError('Cannot write %d channel images to PNG' % C)
+  grid_size = int(ceil(sqrt(N)))
+  grid_height = H * grid_size + padding * (grid_size - 1)
+  grid_width = W * grid_size + padding * (grid_size - 1)
+
+  def chunk(tag, data):
+    return (struct.pack('>I', len(data)) + tag + data +
+            struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+  compressor = zlib.compressobj()
+  with open(filename, 'wb') as f:
+    f.write(b'\x89PNG\r\n\x1a\n')
+    f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', grid_width, grid_height,
+                                       8, color_types[C], 0, 0, 0)))
+    for _, strip in iter_grid_strips(Xs, ubound=255.0, padding=padding):
+      rows = np.zeros((strip.shape[0], 1 + grid_width * C), np.uint8)
+      rows[:, 1:] = np.round(strip).reshape(strip.shape[0], -1)
+      data = compressor.compress(rows.tobytes())
+      if data:
+        f.write(chunk(b'IDAT', data))
+    f.write(chunk(b'IDAT', compressor.flush()))
+    f.write(chunk(b'IEND', b''))
+
+
+def vis_grid(Xs, out=None):
   """ visualize a grid of images """
   (N, H, W, C) = Xs.shape
   A = int(ceil(sqrt(N)))
-  G = np.ones((A*H+A, A*W+A, C), Xs.dtype)
-  G *= np.min(Xs)
-  n = 0
+  ming = np.min(Xs)
+  maxg = np.max(Xs)
+  if out is None:
+    out = np.empty((A*H+A, A*W+A, C),
+                   np.result_type((Xs[:1] - ming) / (maxg - ming)))
+  # tile row by row, padding with the minimum, and normalize to [0,1]
   for y in range(A):
-    for x in range(A):
-      if n < N:
-        G[y*H+y:(y+1)*H+y, x*W+x:(x+1)*W+x, :] = Xs[n,:,:,:]
-        n += 1
-  # normalize to [0,1]
-  maxg = G.max()
-  ming = G.min()
-  G = (G - ming)/(maxg-ming)
-  return G
-  
+    tiles = np.asarray(Xs[y*A:(y+1)*A])
+    strip = _tile_strip(tiles, A, 1, ming)
+    out[y*H+y:(y+1)*H+y] = (strip - ming)/(maxg-ming)
+    out[(y+1)*H+y] = 0
+  return out
+
+
 def vis_nn(rows):
   """ visualize array of arrays of images """
   N = len(rows)
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('matplotlib')
+from cs231n.features import hog_feature
+
+
+def hog_reference(image, orientations, pixels_per_cell):
+  """Cell histograms by explicit loops over cells and orientation bins."""
+  ppr, ppc = pixels_per_cell
+  gx = np.zeros(image.shape)
+  gy = np.zeros(image.shape)
+  gx[:, :-1] = np.diff(image, axis=1)
+  gy[:-1, :] = np.diff(image, axis=0)
+  mag = np.sqrt(gx ** 2 + gy ** 2)
+  ori = np.arctan2(gy, gx + 1e-15) * (180 / np.pi) + 90
+  n_cells_r = image.shape[0] // ppr
+  n_cells_c = image.shape[1] // ppc
+  hist = np.zeros((n_cells_c, n_cells_r, orientations))
+  for c in range(n_cells_c):
+    for r in range(n_cells_r):
+      cell_mag = mag[r * ppr:(r + 1) * ppr, c * ppc:(c + 1) * ppc]
+      cell_ori = ori[r * ppr:(r + 1) * ppr, c * ppc:(c + 1) * ppc]
+      for i in range(orientations):
+        lo = 180. / orientations * i
+        hi = 180. / orientations * (i + 1)
+        in_bin = (cell_ori >= lo) & (cell_ori < hi) & (cell_ori > 0)
+        hist[c, r, i] = cell_mag[in_bin].sum() / (ppr * ppc)
+  return hist
+
+
+def test_default_feature_matches_reference():
+  image = np.random.RandomState(0).rand(32, 32)
+  feat = hog_feature(image)
+  assert feat.shape == (4 * 4 * 9,)
+  assert np.allclose(feat, hog_reference(image, 9, (8, 8)).ravel())
+
+
+@pytest.mark.parametrize('pixels_per_cell', [(4, 8), (8, 4), (3, 5)])
+def test_non_square_cells(pixels_per_cell):
+  image = np.random.RandomState(1).rand(24, 40)
+  feat = hog_feature(image, orientations=6, pixels_per_cell=pixels_per_cell)
+  expected = hog_reference(image, 6, pixels_per_cell)
+  assert np.allclose(feat, expected.ravel())
+
+
+def test_non_square_cells_sum_pixel_histograms():
+  # a cell histogram is the average of the 1x1 cell histograms inside it
+  image = np.random.RandomState(2).rand(12, 20)
+  pixels = hog_feature(image, pixels_per_cell=(1, 1)).reshape(20, 12, 9)
+  cells = hog_feature(image, pixels_per_cell=(3, 4)).reshape(5, 4, 9)
+  expected = pixels.reshape(5, 4, 4, 3, 9).mean(axis=(1, 3))
+  assert np.allclose(cells, expected)
+
+
+def test_block_normalization_shape():
+  image = np.random.RandomState(3).rand(32, 48)
+  feat = hog_feature(image, pixels_per_cell=(8, 8), cells_per_block=(2, 3),
+                     block_norm='L2')
+  blocks = feat.reshape(6 - 3 + 1, 4 - 2 + 1, 3 * 2 * 9)
+  assert np.allclose(np.sqrt(np.sum(blocks ** 2, axis=2)), 1, atol=1e-4)
+
+
+@pytest.mark.parametrize('cells_per_block', [(0, 1), (5, 1), (1, 7)])
+def test_block_must_fit_cell_grid(cells_per_block):
+  image = np.random.RandomState(4).rand(32, 48)
+  with pytest.raises(ValueError):
+    hog_feature(image, cells_per_block=cells_per_block)
@@ -19,7 +19,7 @@ class ThreeLayerConvNet(object):
 
     def __init__(self, input_dim=(3, 32, 32), num_filters=32, filter_size=7,
                  hidden_dim=100, num_classes=10, weight_scale=1e-3, reg=0.0,
-                 dtype=np.float32):
+                 dtype=np.float32, conv_memory_budget=None):
         """
         Initialize a new network.
 
@@ -33,10 +33,17 @@ class ThreeLayerConvNet(object):
           of weights.
         - reg: Scalar giving L2 regularization strength
         - dtype: numpy datatype to use for computation.
+        - conv_memory_budget: If not None, the number of bytes the
+          convolutional layer may keep in its cache for the backward pass;
+          larger column matrices are recomputed in the backward pass instead,
+          see plan_conv_recompute. The planner is meant for networks with
+          several convolutional layers; with the single one here it only
+          decides whether that layer's columns fit into the budget.
         """
         self.params = {}
         self.reg = reg
         self.dtype = dtype
+        self.conv_memory_budget = conv_memory_budget
 
         ############################################################################
         # TODO: Initialize weights and biases for the three-layer convolutional    #
@@ -81,6 +88,10 @@ class ThreeLayerConvNet(object):
         # pass conv_param to the forward pass for the convolutional layer
         filter_size = W1.shape[2]
         conv_param = {'stride': 1, 'pad': (filter_size - 1) // 2}
+        if y is not None:
+            conv_param['recompute'] = plan_conv_recompute(
+                [(X.shape, W1.shape, conv_param, X.dtype)],
+                self.conv_memory_budget)[0]
 
         # pass pool_param to the forward pass for the max-pooling layer
         pool_param = {'pool_height': 2, 'pool_width': 2, 'stride': 2}
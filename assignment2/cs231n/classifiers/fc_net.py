@@ -149,7 +149,8 @@ class FullyConnectedNet(object):
 
     def __init__(self, hidden_dims, input_dim=3*32*32, num_classes=10,
                  dropout=0, use_batchnorm=False, reg=0.0,
-                 weight_scale=1e-2, dtype=np.float32, seed=None):
+                 weight_scale=1e-2, dtype=np.float32, seed=None,
+                 use_workspace=True, cache_mode='full'):
         """
         Initialize a new FullyConnectedNet.
 
@@ -169,6 +170,17 @@ class FullyConnectedNet(object):
         - seed: If not None, then pass this random seed to the dropout layers. This
           will make the dropout layers deteriminstic so we can gradient check the
           model.
+        - use_workspace: If True, the hidden activations and the gradients with
+          respect to them are written into a layers.Workspace, so they are
+          allocated once and then reused on every call to loss().
+        - cache_mode: How the ReLU and dropout layers store what they need for
+          the backward pass: 'full' (default; their float inputs / masks),
+          'mask' (boolean masks) or 'packed' (bit-packed masks). With 'mask'
+          and 'packed' the ReLUs also work in place on the affine outputs.
+          These modes draw the dropout masks differently, so with dropout
+          they give different (equally valid) results for the same seed than
+          'full'. The fused affine-batchnorm-ReLU layers used with
+          use_batchnorm=True recompute their ReLU mask and are not affected.
         """
         self.use_batchnorm = use_batchnorm
         self.use_dropout = dropout > 0
@@ -176,6 +188,10 @@ class FullyConnectedNet(object):
         self.num_layers = 1 + len(hidden_dims)
         self.dtype = dtype
         self.params = {}
+        self.workspace = layers.Workspace() if use_workspace else None
+        if cache_mode not in ('full', 'mask', 'packed'):
+            raise ValueError('Invalid cache_mode "%s"' % cache_mode)
+        self.cache_mode = cache_mode
 
         ############################################################################
         # TODO: Initialize the parameters of the network, storing all values in    #
@@ -221,7 +237,8 @@ class FullyConnectedNet(object):
         # (train / test). You can pass the same dropout_param to each dropout layer.
         self.dropout_param = {}
         if self.use_dropout:
-            self.dropout_param = {'mode': 'train', 'p': dropout}
+            self.dropout_param = {'mode': 'train', 'p': dropout,
+                                  'cache_mode': cache_mode}
             if seed is not None:
                 self.dropout_param['seed'] = seed
 
@@ -239,15 +256,95 @@ class FullyConnectedNet(object):
             self.params[k] = v.astype(dtype)
 
 
+    def fold_batchnorm(self):
+        """
+        Export the parameters for inference. When batch normalization is used,
+        each batchnorm layer is folded into the affine layer before it using
+        its running statistics (see layers.batchnorm_fold), so inference is
+        just a chain of affine and ReLU layers.
+
+        Returns:
+        - params: Dictionary with new arrays W1, b1, ..., WL, bL, to be passed
+          to predict.
+        """
+        params = {}
+        for i in range(self.num_layers):
+            n = str(i+1)
+            w, b = self.params["W"+n], self.params["b"+n]
+            if self.use_batchnorm and i < self.num_layers-1:
+                w, b = layers.batchnorm_fold(w, b, self.params["gamma"+n],
+                                             self.params["beta"+n],
+                                             self.bn_params[i])
+            params["W"+n] = w.astype(self.dtype)
+            params["b"+n] = b.astype(self.dtype)
+        return params
+
+
+    def predict(self, X, params=None):
+        """
+        Compute class scores in test mode without building any cache. The
+        hidden activations are computed in place, and come from the workspace
+        if the model has one, so nothing but the scores is allocated.
+
+        Inputs:
+        - X: Array of input data of shape (N, d_1, ..., d_k)
+        - params: Optional parameters returned by fold_batchnorm. By default
+          self.params is used and batch normalization is applied with the
+          running statistics.
+
+        Returns:
+        - scores: Array of shape (N, C)
+        """
+        folded = params is not None
+        if params is None:
+            params = self.params
+        X = X.astype(self.dtype, copy=False)
+        ws = self.workspace
+        if ws is not None:
+            ws.reset()
+
+        out_layer = X
+        for i in range(self.num_layers-1):
+            n = str(i+1)
+            w = params["W"+n]
+            out_layer, _ = layers.affine_forward(
+                out_layer, w, params["b"+n],
+                out=layers.get_buffer(ws, (X.shape[0], w.shape[1]),
+                                      np.result_type(out_layer, w)))
+            if self.use_batchnorm and not folded:
+                scale, shift = layers.batchnorm_scale_shift(
+                    self.params["gamma"+n], self.params["beta"+n],
+                    self.bn_params[i])
+                out_layer *= scale
+                out_layer += shift
+            np.maximum(out_layer, 0, out=out_layer)
+            # dropout is the identity at test time
+
+        nn = str(self.num_layers)
+        scores, _ = layers.affine_forward(out_layer, params["W"+nn],
+                                          params["b"+nn])
+        return scores
+
+
     def loss(self, X, y=None):
         """
         Compute loss and gradient for the fully-connected net.
 
         Input / output: Same as TwoLayerNet above.
         """
-        X = X.astype(self.dtype)
+        if y is None:
+            # inference does not need any cache, see predict
+            return self.predict(X)
+
+        X = X.astype(self.dtype, copy=False)
         mode = 'test' if y is None else 'train'
 
+        # Buffers from the workspace are reused by the next call, so only
+        # intermediate values go there, never the scores or the grads.
+        ws = self.workspace
+        if ws is not None:
+            ws.reset()
+
         # Set train/test mode for batchnorm params and dropout param since they
         # behave differently during training and testing.
         if self.use_dropout:
@@ -278,25 +375,32 @@ class FullyConnectedNet(object):
             # (zy) The learned parameters are for BN affine transformation used
             # in training, while the running average is used for prediction.
             if self.use_batchnorm:
-                out_layer, cache = affine_bn_relu_forward(out_layer,
-                                                          self.params["W"+n],
-                                                          self.params["b"+n],
-                                                          self.params["gamma"+n],
-                                                          self.params["beta"+n],
-                                                          self.bn_params[i])
+                out_layer, cache = affine_bn_relu_forward(
+                    out_layer, self.params["W"+n], self.params["b"+n],
+                    self.params["gamma"+n], self.params["beta"+n],
+                    self.bn_params[i], ws=ws)
                 caches["affine_bn_relu"].append(cache)
             else:
-                out_layer, cache = layers.affine_forward(out_layer,
-                                                         self.params["W"+n],
-                                                         self.params["b"+n])
+                shape = (X.shape[0], self.params["W"+n].shape[1])
+                out_layer, cache = layers.affine_forward(
+                    out_layer, self.params["W"+n], self.params["b"+n],
+                    out=layers.get_buffer(ws, shape, self.dtype))
                 caches["affine"].append(cache)
 
-                out_layer, cache = layers.relu_forward(out_layer)
+                if self.cache_mode == 'full':
+                    relu_out = layers.get_buffer(ws, out_layer.shape,
+                                                 out_layer.dtype)
+                else:
+                    relu_out = out_layer
+                out_layer, cache = layers.relu_forward(
+                    out_layer, out=relu_out, cache_mode=self.cache_mode)
                 caches["relu"].append(cache)
 
             if self.use_dropout:
-                out_layer, cache = layers.dropout_forward(out_layer,
-                                                          self.dropout_param)
+                # the dropout cache only holds the mask, so it can overwrite
+                # the ReLU output
+                out_layer, cache = layers.dropout_forward(
+                    out_layer, self.dropout_param, out=out_layer)
                 caches["drop"].append(cache)
 
         nn = str(self.num_layers)
@@ -334,7 +438,10 @@ class FullyConnectedNet(object):
                     loss += 0.5 * self.reg * np.sum(v**2)
 
         # get the gradient
-        out = layers.affine_backward(dloss, cache)
+        out = layers.affine_backward(
+            dloss, cache,
+            out=layers.get_buffer(ws, out_layer.shape,
+                                  np.result_type(dloss, cache[1])))
         dout, grads["W"+nn], grads["b"+nn] = out
         grads["W"+nn] += self.reg * cache[1]
 
@@ -342,18 +449,31 @@ class FullyConnectedNet(object):
             n = str(i+1)
 
             if self.use_dropout:
-                dout = layers.dropout_backward(dout, caches["drop"][i])
+                mask = caches["drop"][i][1]
+                if isinstance(mask, tuple):
+                    dtype = dout.dtype
+                else:
+                    dtype = np.result_type(dout, mask)
+                dout = layers.dropout_backward(
+                    dout, caches["drop"][i],
+                    out=layers.get_buffer(ws, dout.shape, dtype))
 
             if self.use_batchnorm:
-                out = affine_bn_relu_backward(dout, caches["affine_bn_relu"][i])
+                out = affine_bn_relu_backward(dout, caches["affine_bn_relu"][i],
+                                              ws=ws)
                 dout, grads["W"+n], grads["b"+n], \
                     grads["gamma"+n], grads["beta"+n] = out
                 grads["W"+n] += self.reg*self.params["W"+n] if self.reg else 0
 
             else:
-                dout = layers.relu_backward(dout, caches["relu"][i])
-
-                out = layers.affine_backward(dout, caches["affine"][i])
+                dout = layers.relu_backward(
+                    dout, caches["relu"][i],
+                    out=layers.get_buffer(ws, dout.shape, dout.dtype))
+
+                x, w = caches["affine"][i][:2]
+                out = layers.affine_backward(
+                    dout, caches["affine"][i],
+                    out=layers.get_buffer(ws, x.shape, np.result_type(dout, w)))
                 dout, grads["W"+n], grads["b"+n] = out
                 # need to include regularization
                 grads["W"+n] += self.reg * caches["affine"][i][1]
@@ -362,34 +482,3 @@ class FullyConnectedNet(object):
         ############################################################################
 
         return loss, grads
-
-
-def affine_bn_relu_forward(x, w, b, gamma, beta, bn_param):
-    """
-    Convenience layer that perorms an affine transform, batch normalization and
-    then a Relu activation.
-
-    Inputs:
-    - x: Input to the affine layer
-    - w, b: Weights for the affine layer
-
-    Returns a tuple of:
-    - out: Output from the ReLU
-    - cache: Object to give to the backward pass
-    """
-    out, fc_cache = layers.affine_forward(x, w, b)
-    out, bn_cache = layers.batchnorm_forward(out, gamma, beta, bn_param)
-    out, relu_cache = layers.relu_forward(out)
-    cache = fc_cache, bn_cache, relu_cache,
-    return out, cache
-
-
-def affine_bn_relu_backward(dout, cache):
-    """
-    Backward pass for the affine-bn-relu convenience layer
-    """
-    fc_cache, bn_cache, relu_cache = cache
-    dx = layers.relu_backward(dout, relu_cache)
-    dx, dgamma, dbeta = layers.batchnorm_backward_alt(dx, bn_cache)
-    dx, dw, db = layers.affine_backward(dx, fc_cache)
-    return dx, dw, db, dgamma, dbeta
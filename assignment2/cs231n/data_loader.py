@@ -0,0 +1,208 @@
+from __future__ import print_function, division
+from builtins import range
+from builtins import object
+import threading
+
+from six.moves import queue
+import numpy as np
+
+
+class DataLoader(object):
+    """
+    A DataLoader produces training minibatches on background threads so that
+    gathering (and optionally augmenting) the next batch overlaps with the
+    forward and backward pass of the current one.
+
+    Minibatches are written into a small pool of preallocated output buffers
+    which are recycled, so no per-step allocation happens once the loader is
+    running. The arrays returned by next() are views of such a buffer: they
+    stay valid until the following call to next(), after which the buffer is
+    handed back to the workers. Copy them if they need to outlive the step.
+
+    Example usage with a Solver:
+
+    data = get_CIFAR10_data()
+    loader = DataLoader(data, batch_size=100, num_workers=2,
+                        augment=[random_flip, random_crop])
+    solver = Solver(model, loader, update_rule='sgd', num_epochs=10)
+    solver.train()
+
+    Like Solver._step, batches are sampled uniformly with replacement unless
+    a sampler is given.
+    """
+
+    def __init__(self, data, batch_size=100, split='train',
+                 keys=('X_%s', 'y_%s'), num_workers=1, prefetch=2,
+                 augment=None, dtype=None, sampler=None, seed=None):
+        """
+        Construct a new DataLoader.
+
+        Required arguments:
+        - data: A dictionary of data as passed to Solver; the arrays that are
+          batched are data[key % split] for every key in keys. The whole
+          dictionary is kept in self.data so a Solver can still evaluate on
+          the validation set.
+
+        Optional arguments:
+        - batch_size: Number of examples per minibatch.
+        - split: Name of the split to draw minibatches from.
+        - keys: Name patterns of the arrays to batch; they must share their
+          first dimension.
+        - num_workers: Number of background threads filling batches.
+        - prefetch: Number of finished batches that may wait in the queue.
+        - augment: A function or list of functions called as f(X, rng) on
+          every freshly gathered batch of the first array; they must modify
+          X in place. See random_flip and random_crop.
+        - dtype: Datatype of the buffers for the first array; defaults to the
+          datatype of the data. Useful to turn uint8 images into float32.
+        - sampler: Optional iterator of index arrays of length batch_size,
+          e.g. ShardedDataset.sampler; by default batches are sampled
+          uniformly with replacement.
+        - seed: Seed for the random number generators of the workers.
+        """
+        self.data = data
+        self.batch_size = batch_size
+        self.split = split
+        self.arrays = [data[k % split] for k in keys]
+        self.num_samples = self.arrays[0].shape[0]
+        self.num_workers = max(num_workers, 1)
+        self.prefetch = max(prefetch, 1)
+        if augment is None:
+            augment = []
+        elif callable(augment):
+            augment = [augment]
+        self.augment = list(augment)
+        self.dtype = dtype
+        self.sampler = sampler
+        self.seed = seed
+
+        self._threads = []
+        self._current = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._rng = np.random.RandomState(seed)
+
+
+    def _allocate(self):
+        """
+        Allocate the output buffers for one minibatch.
+        """
+        slot = []
+        for i, arr in enumerate(self.arrays):
+            dtype = arr.dtype if (i > 0 or self.dtype is None) else self.dtype
+            slot.append(np.empty((self.batch_size,) + tuple(arr.shape[1:]),
+                                 dtype=dtype))
+        return slot
+
+
+    def _gather(self, idx, slot):
+        """
+        Copy the examples selected by idx into the buffers of slot.
+        """
+        for arr, out in zip(self.arrays, slot):
+            if isinstance(arr, np.ndarray) and arr.dtype == out.dtype:
+                np.take(arr, idx, axis=0, out=out)
+            else:
+                out[...] = arr[idx]
+
+
+    def _work(self, rng):
+        while not self._stop.is_set():
+            try:
+                slot = self._free.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                if self.sampler is None:
+                    idx = rng.choice(self.num_samples, self.batch_size)
+                else:
+                    with self._lock:
+                        idx = next(self.sampler)
+                self._gather(idx, slot)
+                for f in self.augment:
+                    f(slot[0], rng)
+            except Exception as e:
+                self._ready.put(e)
+                return
+            self._ready.put(slot)
+
+
+    def start(self):
+        """
+        Allocate the buffers and start the worker threads. This is done
+        automatically by the first call to next().
+        """
+        if self._threads:
+            return
+        num_slots = self.num_workers + self.prefetch + 1
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+        for _ in range(num_slots):
+            self._free.put(self._allocate())
+        self._current = None
+        self._stop.clear()
+        for i in range(self.num_workers):
+            rng = np.random.RandomState(self._rng.randint(2 ** 31))
+            t = threading.Thread(target=self._work, args=(rng,))
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+
+    def close(self):
+        """
+        Stop the worker threads and release the buffers. The loader can be
+        restarted by calling next() again.
+        """
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        self._current = None
+        self._free = self._ready = None
+
+
+    def next(self):
+        """
+        Return the next minibatch as a tuple with one array per key. The
+        arrays are only valid until the next call.
+        """
+        if not self._threads:
+            self.start()
+        if self._current is not None:
+            self._free.put(self._current)
+            self._current = None
+        item = self._ready.get()
+        if isinstance(item, Exception):
+            self.close()
+            raise item
+        self._current = item
+        return tuple(item)
+
+    __next__ = next
+
+
+    def __iter__(self):
+        return self
+
+
+def random_flip(X, rng):
+    """
+    Flip a random half of a minibatch of images of shape (N, C, H, W)
+    horizontally, in place.
+    """
+    mask = rng.rand(X.shape[0]) < 0.5
+    X[mask] = X[mask, :, :, ::-1]
+
+
+def random_crop(X, rng, padding=4):
+    """
+    Zero-pad a minibatch of images of shape (N, C, H, W) by padding pixels on
+    every side and take a random crop of the original size, in place.
+    """
+    N, C, H, W = X.shape
+    p = padding
+    X_padded = np.pad(X, ((0, 0), (0, 0), (p, p), (p, p)), mode='constant')
+    dy, dx = rng.randint(0, 2 * p + 1, size=(2, N))
+    for i in range(N):
+        X[i] = X_padded[i, :, dy[i]:dy[i] + H, dx[i]:dx[i] + W]
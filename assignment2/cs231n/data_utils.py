@@ -4,8 +4,14 @@ from builtins import range
 from six.moves import cPickle as pickle
 import numpy as np
 import os
+import collections
+import json
+import stat
+import struct
+import tempfile
 from scipy.misc import imread
 import platform
+from multiprocessing.pool import ThreadPool
 
 def load_pickle(f):
     version = platform.python_version_tuple()
@@ -41,39 +47,302 @@ def load_CIFAR10(ROOT):
     return Xtr, Ytr, Xte, Yte
 
 
+ARRAY_BUNDLE_MAGIC = b'CS231NAB'
+ARRAY_BUNDLE_ALIGN = 64
+
+
+def _plain_file_mode(filename):
+    """
+    Return the permission bits that open() gives a new file next to
+    filename, i.e. 0o666 minus the umask, without changing the process-wide
+    umask the way os.umask would.
+    """
+    probe = filename + '.mode'
+    fd = os.open(probe, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        return stat.S_IMODE(os.fstat(fd).st_mode)
+    finally:
+        os.close(fd)
+        os.remove(probe)
+
+
+def save_array_bundle(filename, arrays, info=None):
+    """
+    Write several arrays into a single flat binary file that can later be
+    memory-mapped with load_array_bundle.
+
+    The file starts with an 8 byte magic string and a little-endian uint64
+    giving the length of a JSON index; the index records the dtype, shape and
+    byte offset of every array, plus an optional dictionary of extra info.
+    Every array is stored C-contiguous and aligned to ARRAY_BUNDLE_ALIGN bytes.
+    The file is written under a unique temporary name in the same directory
+    and renamed into place, so concurrent readers never see a partially
+    written bundle and concurrent writers do not clobber each other; if
+    writing fails the temporary file is removed.
+
+    Inputs:
+    - filename: Path of the file to write.
+    - arrays: Dictionary mapping names to numpy arrays.
+    - info: Optional JSON-serializable dictionary stored in the index.
+    """
+    def align(n):
+        return -(-n // ARRAY_BUNDLE_ALIGN) * ARRAY_BUNDLE_ALIGN
+
+    # The header size depends on the offsets and vice versa, so lay the arrays
+    # out against a generous upper bound on the header length.
+    names = sorted(arrays)
+    index = {'arrays': {}, 'info': info or {}}
+    for name in names:
+        arr = arrays[name]
+        index['arrays'][name] = {'dtype': arr.dtype.str,
+                                 'shape': list(arr.shape), 'offset': 0}
+    header_len = len(json.dumps(index).encode('utf-8')) + 32 * len(names) + 16
+    offset = align(len(ARRAY_BUNDLE_MAGIC) + 8 + header_len)
+    for name in names:
+        index['arrays'][name]['offset'] = offset
+        offset = align(offset + arrays[name].nbytes)
+    header = json.dumps(index).encode('utf-8').ljust(header_len)
+
+    # a unique temporary file, so concurrent writers of the same bundle never
+    # write into each other's file; the last rename wins
+    fd, tmp_filename = tempfile.mkstemp(
+        dir=os.path.dirname(filename) or '.',
+        prefix=os.path.basename(filename) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(ARRAY_BUNDLE_MAGIC)
+            f.write(struct.pack('<Q', header_len))
+            f.write(header)
+            for name in names:
+                f.seek(index['arrays'][name]['offset'])
+                np.ascontiguousarray(arrays[name]).tofile(f)
+            f.truncate(offset)
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_filename, _plain_file_mode(tmp_filename))
+        os.rename(tmp_filename, filename)
+    except BaseException:
+        os.remove(tmp_filename)
+        raise
+
+
+def load_array_bundle(filename, mode='r'):
+    """
+    Memory-map all arrays of a file written by save_array_bundle. Nothing is
+    read from disk until the arrays are accessed, and processes that map the
+    same file share its pages.
+
+    Inputs:
+    - filename: Path of the bundle.
+    - mode: Mode passed to np.memmap; 'r' (default) maps read-only.
+
+    Returns a tuple of:
+    - arrays: Dictionary mapping names to np.memmap arrays.
+    - info: The info dictionary passed to save_array_bundle.
+    """
+    with open(filename, 'rb') as f:
+        magic = f.read(len(ARRAY_BUNDLE_MAGIC))
+        if magic != ARRAY_BUNDLE_MAGIC:
+            raise ValueError('"%s" is not an array bundle' % filename)
+        header_len, = struct.unpack('<Q', f.read(8))
+        index = json.loads(f.read(header_len).decode('utf-8'))
+
+    arrays = {}
+    for name, entry in index['arrays'].items():
+        shape = tuple(entry['shape'])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.zeros(shape, dtype=entry['dtype'])
+            continue
+        arrays[name] = np.memmap(filename, dtype=entry['dtype'], mode=mode,
+                                 offset=entry['offset'], shape=shape)
+    return arrays, index['info']
+
+
+class LazyImageArray(object):
+    """
+    Read-only wrapper around a uint8 image array (typically a memmap) that
+    converts to floating point only for the elements being indexed, so a
+    minibatch X[batch_mask] costs one small cast instead of holding the
+    whole dataset as float64.
+
+    Supports the parts of the ndarray API used by Solver: shape, len() and
+    indexing along the first axis.
+    """
+
+    def __init__(self, data, dtype=np.float64, axes=None):
+        """
+        Inputs:
+        - data: Array of shape (N, ...) holding the raw data.
+        - dtype: Datatype returned by indexing.
+        - axes: Optional permutation applied to every batch, e.g. (0, 3, 1, 2)
+          to turn NHWC storage into NCHW batches.
+        """
+        self.data = data
+        self.dtype = np.dtype(dtype)
+        self.axes = tuple(axes) if axes is not None else None
+        if self.axes is None:
+            self.shape = tuple(data.shape)
+        else:
+            self.shape = tuple(data.shape[a] for a in self.axes)
+        self.ndim = len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, idx):
+        batch = np.asarray(self.data[idx])
+        if self.axes is not None:
+            if batch.ndim == self.ndim:
+                batch = batch.transpose(self.axes)
+            else:
+                # a single example was selected
+                batch = batch.transpose([a - 1 for a in self.axes[1:]])
+        return batch.astype(self.dtype)
+
+
+def convert_CIFAR10(ROOT, cache_file, layout='NHWC'):
+    """
+    One-time conversion of the pickled CIFAR-10 batches into an array bundle
+    holding uint8 images (about 180 MB instead of 1.4 GB of float64).
+
+    Inputs:
+    - ROOT: Directory containing the python version of CIFAR-10.
+    - cache_file: Path of the bundle to write.
+    - layout: 'NHWC' (same as load_CIFAR10) or 'NCHW' (same as
+      get_CIFAR10_data).
+    """
+    if layout not in ('NHWC', 'NCHW'):
+        raise ValueError('Invalid layout "%s"' % layout)
+
+    def load_raw(filename):
+        with open(filename, 'rb') as f:
+            datadict = load_pickle(f)
+        X = np.asarray(datadict['data'], dtype=np.uint8)
+        X = X.reshape(-1, 3, 32, 32)
+        if layout == 'NHWC':
+            X = X.transpose(0, 2, 3, 1)
+        return X, np.asarray(datadict['labels'], dtype=np.int64)
+
+    xs, ys = [], []
+    for b in range(1, 6):
+        X, Y = load_raw(os.path.join(ROOT, 'data_batch_%d' % (b, )))
+        xs.append(X)
+        ys.append(Y)
+    Xte, Yte = load_raw(os.path.join(ROOT, 'test_batch'))
+    arrays = {
+      'X_train': np.concatenate(xs), 'y_train': np.concatenate(ys),
+      'X_test': Xte, 'y_test': Yte,
+    }
+    save_array_bundle(cache_file, arrays, info={'layout': layout})
+
+
+def load_CIFAR10_cached(ROOT, cache_file=None, layout='NHWC',
+                        dtype=np.float64):
+    """
+    Load CIFAR-10 from a memory-mapped uint8 cache, creating the cache with
+    convert_CIFAR10 on first use. Startup takes milliseconds and the image
+    data is shared through the page cache by every process using it.
+
+    Inputs:
+    - ROOT: Directory containing the python version of CIFAR-10.
+    - cache_file: Path of the cache; defaults to cifar10_<layout>.bin in ROOT.
+    - layout: Layout of the returned images, 'NHWC' or 'NCHW'.
+    - dtype: If not None, images are returned as LazyImageArray objects that
+      convert each indexed batch to this dtype; if None the raw uint8 memmaps
+      are returned.
+
+    Returns a tuple (Xtr, Ytr, Xte, Yte) like load_CIFAR10.
+    """
+    if cache_file is None:
+        cache_file = os.path.join(ROOT, 'cifar10_%s.bin' % layout.lower())
+    if not os.path.isfile(cache_file):
+        convert_CIFAR10(ROOT, cache_file, layout=layout)
+
+    arrays, info = load_array_bundle(cache_file)
+    if info['layout'] != layout:
+        raise ValueError('Cache "%s" has layout %s, not %s'
+                         % (cache_file, info['layout'], layout))
+    Xtr, Ytr = arrays['X_train'], arrays['y_train']
+    Xte, Yte = arrays['X_test'], arrays['y_test']
+    if dtype is not None:
+        Xtr = LazyImageArray(Xtr, dtype=dtype)
+        Xte = LazyImageArray(Xte, dtype=dtype)
+    return Xtr, Ytr, Xte, Yte
+
+
+def image_mean(X, chunk_size=1000):
+    """
+    Mean image of X computed in chunks with a float64 accumulator, so uint8 or
+    memory-mapped data is never converted as a whole.
+    """
+    acc = np.zeros(X.shape[1:], dtype=np.float64)
+    for start in range(0, X.shape[0], chunk_size):
+        acc += np.sum(X[start:start + chunk_size], axis=0, dtype=np.float64)
+    return acc / max(X.shape[0], 1)
+
+
+def preprocess_images(X, mean_image=None, axes=(0, 3, 1, 2),
+                      dtype=np.float64, chunk_size=1000):
+    """
+    Subtract the mean image and change the layout of X in one pass, writing
+    straight into a preallocated output array. Only one chunk of temporaries
+    is alive at any time, so the peak memory is the size of the output.
+
+    Inputs:
+    - X: Array of images of shape (N, ...), e.g. a uint8 memmap.
+    - mean_image: Optional array of shape X.shape[1:] to subtract.
+    - axes: Permutation applied to every chunk; the default turns NHWC images
+      into NCHW.
+    - dtype: Datatype of the output.
+    - chunk_size: Number of images processed at a time.
+
+    Returns:
+    - out: Array of shape X.shape permuted by axes.
+    """
+    out = np.empty([X.shape[a] for a in axes], dtype=dtype)
+    if mean_image is not None:
+        mean_image = mean_image.transpose([a - 1 for a in axes[1:]])
+    for start in range(0, X.shape[0], chunk_size):
+        chunk = np.asarray(X[start:start + chunk_size]).transpose(axes)
+        dst = out[start:start + chunk_size]
+        if mean_image is None:
+            dst[...] = chunk
+        else:
+            np.subtract(chunk, mean_image, out=dst, casting='unsafe')
+    return out
+
+
 def get_CIFAR10_data(num_training=49000, num_validation=1000, num_test=1000,
-                     subtract_mean=True):
+                     subtract_mean=True, dtype=np.float64):
     """
     Load the CIFAR-10 dataset from disk and perform preprocessing to prepare
     it for classifiers. These are the same steps as we used for the SVM, but
     condensed to a single function.
+
+    The raw images come from the uint8 cache of load_CIFAR10_cached; the
+    splits are slices of it, the mean is accumulated in chunks and every
+    split is normalized and transposed to NCHW in a single pass, so the peak
+    memory is about the size of the returned arrays.
     """
     # Load the raw CIFAR-10 data
     cifar10_dir = 'cs231n/datasets/cifar-10-batches-py'
-    X_train, y_train, X_test, y_test = load_CIFAR10(cifar10_dir)
-
-    # Subsample the data
-    mask = list(range(num_training, num_training + num_validation))
-    X_val = X_train[mask]
-    y_val = y_train[mask]
-    mask = list(range(num_training))
-    X_train = X_train[mask]
-    y_train = y_train[mask]
-    mask = list(range(num_test))
-    X_test = X_test[mask]
-    y_test = y_test[mask]
+    X_train, y_train, X_test, y_test = load_CIFAR10_cached(cifar10_dir,
+                                                           dtype=None)
+
+    # Subsample the data; slicing the memmaps copies nothing
+    X_val = X_train[num_training:num_training + num_validation]
+    y_val = np.array(y_train[num_training:num_training + num_validation])
+    X_train = X_train[:num_training]
+    y_train = np.array(y_train[:num_training])
+    X_test = X_test[:num_test]
+    y_test = np.array(y_test[:num_test])
 
     # Normalize the data: subtract the mean image
-    if subtract_mean:
-        mean_image = np.mean(X_train, axis=0)
-        X_train -= mean_image
-        X_val -= mean_image
-        X_test -= mean_image
+    mean_image = image_mean(X_train) if subtract_mean else None
 
-    # Transpose so that channels come first
-    X_train = X_train.transpose(0, 3, 1, 2).copy()
-    X_val = X_val.transpose(0, 3, 1, 2).copy()
-    X_test = X_test.transpose(0, 3, 1, 2).copy()
+    # Subtract the mean and transpose so that channels come first
+    X_train = preprocess_images(X_train, mean_image, dtype=dtype)
+    X_val = preprocess_images(X_val, mean_image, dtype=dtype)
+    X_test = preprocess_images(X_test, mean_image, dtype=dtype)
 
     # Package data into a dictionary
     return {
@@ -83,28 +352,48 @@ def get_CIFAR10_data(num_training=49000, num_validation=1000, num_test=1000,
     }
 
 
-def load_tiny_imagenet(path, dtype=np.float32, subtract_mean=True):
+def decode_images(filenames, out, num_workers=8):
     """
-    Load TinyImageNet. Each of TinyImageNet-100-A, TinyImageNet-100-B, and
-    TinyImageNet-200 have the same directory structure, so this can be used
-    to load any of them.
+    Decode image files into a preallocated uint8 array using a pool of
+    threads. Each worker writes its images directly into out, so no
+    intermediate lists or concatenations are needed.
 
     Inputs:
-    - path: String giving path to the directory to load.
-    - dtype: numpy datatype used to load the data.
-    - subtract_mean: Whether to subtract the mean training image.
+    - filenames: List of N image paths.
+    - out: Array of shape (N, C, H, W) to fill; grayscale images are
+      broadcast over the channels.
+    - num_workers: Number of decoding threads; 0 or 1 decodes serially.
+    """
+    def decode(i):
+        img = imread(filenames[i])
+        if img.ndim == 2:
+            ## grayscale file
+            img = img[:, :, np.newaxis]
+        out[i] = img.transpose(2, 0, 1)
+
+    if num_workers is None or num_workers <= 1:
+        for i in range(len(filenames)):
+            decode(i)
+        return out
+    pool = ThreadPool(num_workers)
+    try:
+        pool.map(decode, range(len(filenames)), chunksize=64)
+    finally:
+        pool.close()
+        pool.join()
+    return out
+
+
+def convert_tiny_imagenet(path, cache_file, num_workers=8):
+    """
+    Decode TinyImageNet once into an array bundle of uint8 images (see
+    save_array_bundle), together with the labels, class names and the mean
+    training image.
 
-    Returns: A dictionary with the following entries:
-    - class_names: A list where class_names[i] is a list of strings giving the
-      WordNet names for class i in the loaded dataset.
-    - X_train: (N_tr, 3, 64, 64) array of training images
-    - y_train: (N_tr,) array of training labels
-    - X_val: (N_val, 3, 64, 64) array of validation images
-    - y_val: (N_val,) array of validation labels
-    - X_test: (N_test, 3, 64, 64) array of testing images.
-    - y_test: (N_test,) array of test labels; if test labels are not available
-      (such as in student code) then y_test will be None.
-    - mean_image: (3, 64, 64) array giving mean training image
+    Inputs:
+    - path: String giving path to the directory to load.
+    - cache_file: Path of the bundle to write.
+    - num_workers: Number of threads used to decode the JPEGs.
     """
     # First load wnids
     with open(os.path.join(path, 'wnids.txt'), 'r') as f:
@@ -120,66 +409,31 @@ def load_tiny_imagenet(path, dtype=np.float32, subtract_mean=True):
             wnid_to_words[wnid] = [w.strip() for w in words.split(',')]
     class_names = [wnid_to_words[wnid] for wnid in wnids]
 
-    # Next load training data.
-    X_train = []
+    # Collect the training files; the boxes file of every synset lists them
+    train_files = []
     y_train = []
-    for i, wnid in enumerate(wnids):
-        if (i + 1) % 20 == 0:
-            print('loading training data for synset %d / %d'
-                  % (i + 1, len(wnids)))
-        # To figure out the filenames we need to open the boxes file
+    for wnid in wnids:
         boxes_file = os.path.join(path, 'train', wnid, '%s_boxes.txt' % wnid)
         with open(boxes_file, 'r') as f:
             filenames = [x.split('\t')[0] for x in f]
-        num_images = len(filenames)
-
-        X_train_block = np.zeros((num_images, 3, 64, 64), dtype=dtype)
-        y_train_block = wnid_to_label[wnid] * \
-                        np.ones(num_images, dtype=np.int64)
-        for j, img_file in enumerate(filenames):
-            img_file = os.path.join(path, 'train', wnid, 'images', img_file)
-            img = imread(img_file)
-            if img.ndim == 2:
-        ## grayscale file
-                img.shape = (64, 64, 1)
-            X_train_block[j] = img.transpose(2, 0, 1)
-        X_train.append(X_train_block)
-        y_train.append(y_train_block)
-
-    # We need to concatenate all training data
-    X_train = np.concatenate(X_train, axis=0)
-    y_train = np.concatenate(y_train, axis=0)
-
-    # Next load validation data
+        train_files.extend(os.path.join(path, 'train', wnid, 'images', img_file)
+                           for img_file in filenames)
+        y_train.extend([wnid_to_label[wnid]] * len(filenames))
+
+    # Next the validation files
+    val_files = []
+    y_val = []
     with open(os.path.join(path, 'val', 'val_annotations.txt'), 'r') as f:
-        img_files = []
-        val_wnids = []
         for line in f:
             img_file, wnid = line.split('\t')[:2]
-            img_files.append(img_file)
-            val_wnids.append(wnid)
-        num_val = len(img_files)
-        y_val = np.array([wnid_to_label[wnid] for wnid in val_wnids])
-        X_val = np.zeros((num_val, 3, 64, 64), dtype=dtype)
-        for i, img_file in enumerate(img_files):
-            img_file = os.path.join(path, 'val', 'images', img_file)
-            img = imread(img_file)
-            if img.ndim == 2:
-                img.shape = (64, 64, 1)
-            X_val[i] = img.transpose(2, 0, 1)
-
-    # Next load test images
+            val_files.append(os.path.join(path, 'val', 'images', img_file))
+            y_val.append(wnid_to_label[wnid])
+
     # Students won't have test labels, so we need to iterate over files in the
     # images directory.
-    img_files = os.listdir(os.path.join(path, 'test', 'images'))
-    X_test = np.zeros((len(img_files), 3, 64, 64), dtype=dtype)
-    for i, img_file in enumerate(img_files):
-        img_file = os.path.join(path, 'test', 'images', img_file)
-        img = imread(img_file)
-        if img.ndim == 2:
-            img.shape = (64, 64, 1)
-        X_test[i] = img.transpose(2, 0, 1)
-
+    test_names = sorted(os.listdir(os.path.join(path, 'test', 'images')))
+    test_files = [os.path.join(path, 'test', 'images', img_file)
+                  for img_file in test_names]
     y_test = None
     y_test_file = os.path.join(path, 'test', 'test_annotations.txt')
     if os.path.isfile(y_test_file):
@@ -189,48 +443,249 @@ def load_tiny_imagenet(path, dtype=np.float32, subtract_mean=True):
                 line = line.split('\t')
                 img_file_to_wnid[line[0]] = line[1]
         y_test = [wnid_to_label[img_file_to_wnid[img_file]]
-                  for img_file in img_files]
-        y_test = np.array(y_test)
+                  for img_file in test_names]
+
+    arrays = {}
+    for split, files in (('train', train_files), ('val', val_files),
+                         ('test', test_files)):
+        print('decoding %d %s images' % (len(files), split))
+        X = np.empty((len(files), 3, 64, 64), dtype=np.uint8)
+        arrays['X_%s' % split] = decode_images(files, X, num_workers)
+    arrays['y_train'] = np.array(y_train, dtype=np.int64)
+    arrays['y_val'] = np.array(y_val, dtype=np.int64)
+    if y_test is not None:
+        arrays['y_test'] = np.array(y_test, dtype=np.int64)
+    arrays['mean_image'] = image_mean(arrays['X_train'])
+
+    info = {'class_names': class_names, 'test_files': test_names}
+    save_array_bundle(cache_file, arrays, info=info)
+
+
+def load_tiny_imagenet(path, dtype=np.float32, subtract_mean=True,
+                       num_workers=8, cache_file=None):
+    """
+    Load TinyImageNet. Each of TinyImageNet-100-A, TinyImageNet-100-B, and
+    TinyImageNet-200 have the same directory structure, so this can be used
+    to load any of them.
 
-    mean_image = X_train.mean(axis=0)
-    if subtract_mean:
-        X_train -= mean_image[None]
-        X_val -= mean_image[None]
-        X_test -= mean_image[None]
+    The first call decodes all JPEGs with a thread pool and stores them as a
+    memory-mappable uint8 cache (see convert_tiny_imagenet); later calls only
+    map that file.
 
-    return {
-      'class_names': class_names,
-      'X_train': X_train,
-      'y_train': y_train,
-      'X_val': X_val,
-      'y_val': y_val,
-      'X_test': X_test,
-      'y_test': y_test,
-      'class_names': class_names,
+    Inputs:
+    - path: String giving path to the directory to load.
+    - dtype: numpy datatype used to load the data. If None, the images are
+      returned as read-only uint8 memmaps of the cache and subtract_mean is
+      ignored, which makes loading near-instant.
+    - subtract_mean: Whether to subtract the mean training image.
+    - num_workers: Number of threads used to decode images on the first call.
+    - cache_file: Path of the cache; defaults to tiny_imagenet.bin in path.
+
+    Returns: A dictionary with the following entries:
+    - class_names: A list where class_names[i] is a list of strings giving the
+      WordNet names for class i in the loaded dataset.
+    - X_train: (N_tr, 3, 64, 64) array of training images
+    - y_train: (N_tr,) array of training labels
+    - X_val: (N_val, 3, 64, 64) array of validation images
+    - y_val: (N_val,) array of validation labels
+    - X_test: (N_test, 3, 64, 64) array of testing images.
+    - y_test: (N_test,) array of test labels; if test labels are not available
+      (such as in student code) then y_test will be None.
+    - mean_image: (3, 64, 64) array giving mean training image
+    """
+    if cache_file is None:
+        cache_file = os.path.join(path, 'tiny_imagenet.bin')
+    if not os.path.isfile(cache_file):
+        convert_tiny_imagenet(path, cache_file, num_workers=num_workers)
+    arrays, info = load_array_bundle(cache_file)
+
+    mean_image = np.array(arrays['mean_image'])
+    data = {
+      'class_names': info['class_names'],
+      'y_train': arrays['y_train'],
+      'y_val': arrays['y_val'],
+      'y_test': arrays.get('y_test'),
       'mean_image': mean_image,
     }
+    for split in ('train', 'val', 'test'):
+        X = arrays['X_%s' % split]
+        if dtype is not None:
+            X = preprocess_images(X, mean_image if subtract_mean else None,
+                                  axes=(0, 1, 2, 3), dtype=dtype)
+        data['X_%s' % split] = X
+    if dtype is not None:
+        mean_image = mean_image.astype(dtype)
+        data['mean_image'] = mean_image
+    return data
+
+
+def save_model_bundle(filename, model, info=None, arrays=None):
+    """
+    Save a model as an array bundle (see save_array_bundle) so that its
+    weights can later be memory-mapped instead of unpickled.
+
+    Every array in model.params is stored as its own entry; the rest of the
+    model object is pickled without its params into a small byte array.
+
+    Inputs:
+    - filename: Path of the file to write.
+    - model: A model object with a params dictionary of numpy arrays.
+    - info: Optional JSON-serializable dictionary stored in the header, e.g.
+      the epoch and accuracy histories of a checkpoint.
+    - arrays: Optional dictionary of further arrays stored next to the
+      weights, e.g. optimizer state; read them back with load_array_bundle.
+      Names must not be 'model' or start with 'param/'.
+    """
+    extra = dict(arrays or {})
+    for name in extra:
+        if name == 'model' or name.startswith('param/'):
+            raise ValueError('Invalid array name "%s"' % name)
+    params = model.params
+    model.params = {}
+    try:
+        skeleton = pickle.dumps(model, protocol=2)
+    finally:
+        model.params = params
+    arrays = {'param/%s' % k: np.asarray(v) for k, v in params.items()}
+    arrays['model'] = np.frombuffer(skeleton, dtype=np.uint8)
+    arrays.update((k, np.asarray(v)) for k, v in extra.items())
+    info = dict(info or {})
+    info['model_class'] = type(model).__name__
+    save_array_bundle(filename, arrays, info=info)
+
+
+def load_model_bundle(filename):
+    """
+    Load a model written by save_model_bundle. The params are copy-on-write
+    memmaps of the file: nothing is read until a weight is used, and updating
+    a weight never modifies the file.
+    """
+    arrays, _ = load_array_bundle(filename, mode='c')
+    model = pickle.loads(arrays.pop('model').tobytes())
+    model.params = {k[len('param/'):]: v for k, v in arrays.items()
+                    if k.startswith('param/')}
+    return model
+
+
+class ModelRegistry(object):
+    """
+    Lazy, size-bounded collection of the models saved in a directory.
+
+    Available models are listed by looking at the first bytes of every file
+    only: array bundles (save_model_bundle) and binary pickles are detected
+    from their headers, and files ending in .pkl are assumed to be text
+    pickles. A model is loaded the first time it is accessed; bundles are
+    memory-mapped rather than read. At most max_resident models are kept in
+    memory, the least recently used one being dropped first.
+
+    Example usage:
+
+    registry = ModelRegistry('models', max_resident=2)
+    for name in registry.names():
+        print(name, registry.info(name))
+    model = registry['model_epoch_10.bin']
+    """
+
+    def __init__(self, models_dir, max_resident=4):
+        """
+        Inputs:
+        - models_dir: String giving the path to a directory of model files.
+        - max_resident: Maximum number of loaded models kept in memory, or
+          None for no limit.
+        """
+        self.models_dir = models_dir
+        self.max_resident = max_resident
+        self._resident = collections.OrderedDict()
+        self._formats = {}
+        for model_file in sorted(os.listdir(models_dir)):
+            path = os.path.join(models_dir, model_file)
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                magic = f.read(len(ARRAY_BUNDLE_MAGIC))
+            if magic == ARRAY_BUNDLE_MAGIC:
+                self._formats[model_file] = 'bundle'
+            elif magic[:1] == b'\x80' or model_file.endswith('.pkl'):
+                self._formats[model_file] = 'pickle'
+
+    def names(self):
+        """ Names of the available model files. """
+        return sorted(self._formats)
+
+    def __len__(self):
+        return len(self._formats)
+
+    def __contains__(self, name):
+        return name in self._formats
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def info(self, name):
+        """
+        Header information of a model without loading its weights: the info
+        dictionary and array shapes for bundles, an empty dictionary for
+        pickles.
+        """
+        if self._formats[name] != 'bundle':
+            return {}
+        arrays, info = load_array_bundle(os.path.join(self.models_dir, name))
+        info = dict(info)
+        info['shapes'] = {k[len('param/'):]: v.shape
+                          for k, v in arrays.items() if k.startswith('param/')}
+        return info
+
+    def __getitem__(self, name):
+        if name in self._resident:
+            model = self._resident.pop(name)
+            self._resident[name] = model
+            return model
+        if name not in self._formats:
+            raise KeyError(name)
+        path = os.path.join(self.models_dir, name)
+        if self._formats[name] == 'bundle':
+            model = load_model_bundle(path)
+        else:
+            with open(path, 'rb') as f:
+                try:
+                    model = load_pickle(f)['model']
+                except (pickle.UnpicklingError, KeyError, TypeError):
+                    raise KeyError('"%s" is not a model file' % name)
+        self._resident[name] = model
+        if self.max_resident is not None:
+            while len(self._resident) > self.max_resident:
+                self._resident.popitem(last=False)
+        return model
 
 
 def load_models(models_dir):
     """
-    Load saved models from disk. This will attempt to unpickle all files in a
+    Load saved models from disk. This will attempt to load all files in a
     directory; any files that give errors on unpickling (such as README.txt)
-    will be skipped.
+    will be skipped. Use a ModelRegistry instead to load models lazily.
 
     Inputs:
     - models_dir: String giving the path to a directory containing model files.
-      Each model file is a pickled dictionary with a 'model' field.
+      Each model file is a pickled dictionary with a 'model' field, or a
+      bundle written by save_model_bundle.
 
     Returns:
     A dictionary mapping model file names to models.
     """
     models = {}
+    registry = ModelRegistry(models_dir, max_resident=None)
     for model_file in os.listdir(models_dir):
-        with open(os.path.join(models_dir, model_file), 'rb') as f:
+        if model_file in registry:
             try:
-                models[model_file] = load_pickle(f)['model']
-            except pickle.UnpicklingError:
+                models[model_file] = registry[model_file]
+            except KeyError:
                 continue
+        else:
+            with open(os.path.join(models_dir, model_file), 'rb') as f:
+                try:
+                    models[model_file] = load_pickle(f)['model']
+                except pickle.UnpicklingError:
+                    continue
     return models
 
 
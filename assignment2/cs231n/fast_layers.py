@@ -1,12 +1,24 @@
 from __future__ import print_function
+import collections
+import json
+import os
+import tempfile
+import time
+import warnings
+
 import numpy as np
 try:
     from cs231n.im2col_cython import col2im_cython, im2col_cython
     from cs231n.im2col_cython import col2im_6d_cython
 except ImportError:
-    print('run the following from the cs231n directory and try again:')
-    print('python setup.py build_ext --inplace')
-    print('You may also need to restart your iPython kernel')
+    warnings.warn(
+        'The im2col_cython extension is not built; falling back to the NumPy '
+        'implementations in cs231n.im2col. To build it, run the '
+        'following from the cs231n directory and restart your iPython '
+        'kernel:\npython setup.py build_ext --inplace', RuntimeWarning)
+    from cs231n.im2col import im2col_numpy as im2col_cython
+    from cs231n.im2col import col2im_numpy as col2im_cython
+    from cs231n.im2col import col2im_6d_numpy as col2im_6d_cython
 
 from cs231n.im2col import *
 
@@ -15,6 +27,12 @@ def conv_forward_im2col(x, w, b, conv_param):
     """
     A fast implementation of the forward pass for a convolutional layer
     based on im2col and col2im.
+
+    The column matrix x_cols is usually kept in the cache for the backward
+    pass. It is (HH * WW) / stride**2 times the size of x, so if
+    conv_param['recompute'] is True it is dropped instead and rebuilt from x
+    in the backward pass; see plan_conv_recompute. The same holds for
+    conv_forward_strides.
     """
     N, C, H, W = x.shape
     num_filters, _, filter_height, filter_width = w.shape
@@ -36,18 +54,19 @@ def conv_forward_im2col(x, w, b, conv_param):
     out = res.reshape(w.shape[0], out.shape[2], out.shape[3], x.shape[0])
     out = out.transpose(3, 0, 1, 2)
 
+    if conv_param.get('recompute', False):
+        x_cols = None
     cache = (x, w, b, conv_param, x_cols)
     return out, cache
 
 
-def conv_forward_strides(x, w, b, conv_param):
+def strides_im2col(x, HH, WW, pad, stride):
+    """
+    im2col by stride tricks. Returns x_cols of shape
+    (C * HH * WW, N * out_h * out_w) with the columns in (N, out_h, out_w)
+    order, as used by conv_forward_strides.
+    """
     N, C, H, W = x.shape
-    F, _, HH, WW = w.shape
-    stride, pad = conv_param['stride'], conv_param['pad']
-
-    # Check dimensions
-    #assert (W + 2 * pad - WW) % stride == 0, 'width does not work'
-    #assert (H + 2 * pad - HH) % stride == 0, 'height does not work'
 
     # Pad the input
     p = pad
@@ -67,6 +86,21 @@ def conv_forward_strides(x, w, b, conv_param):
                   shape=shape, strides=strides)
     x_cols = np.ascontiguousarray(x_stride)
     x_cols.shape = (C * HH * WW, N * out_h * out_w)
+    return x_cols
+
+
+def conv_forward_strides(x, w, b, conv_param):
+    N, C, H, W = x.shape
+    F, _, HH, WW = w.shape
+    stride, pad = conv_param['stride'], conv_param['pad']
+
+    # Check dimensions
+    #assert (W + 2 * pad - WW) % stride == 0, 'width does not work'
+    #assert (H + 2 * pad - HH) % stride == 0, 'height does not work'
+
+    out_h = (H + 2 * pad - HH) // stride + 1
+    out_w = (W + 2 * pad - WW) // stride + 1
+    x_cols = strides_im2col(x, HH, WW, pad, stride)
 
     # Now all our convolutions are a big matrix multiply
     res = w.reshape(F, -1).dot(x_cols) + b.reshape(-1, 1)
@@ -80,6 +114,8 @@ def conv_forward_strides(x, w, b, conv_param):
     # comparison we won't either
     out = np.ascontiguousarray(out)
 
+    if conv_param.get('recompute', False):
+        x_cols = None
     cache = (x, w, b, conv_param, x_cols)
     return out, cache
 
@@ -91,6 +127,8 @@ def conv_backward_strides(dout, cache):
     N, C, H, W = x.shape
     F, _, HH, WW = w.shape
     _, _, out_h, out_w = dout.shape
+    if x_cols is None:
+        x_cols = strides_im2col(x, HH, WW, pad, stride)
 
     db = np.sum(dout, axis=(0, 2, 3))
 
@@ -115,6 +153,8 @@ def conv_backward_im2col(dout, cache):
     db = np.sum(dout, axis=(0, 2, 3))
 
     num_filters, _, filter_height, filter_width = w.shape
+    if x_cols is None:
+        x_cols = im2col_cython(x, filter_height, filter_width, pad, stride)
     dout_reshaped = dout.transpose(1, 2, 3, 0).reshape(num_filters, -1)
     dw = dout_reshaped.dot(x_cols.T).reshape(w.shape)
 
@@ -126,31 +166,554 @@ def conv_backward_im2col(dout, cache):
     return dx, dw, db
 
 
-conv_forward_fast = conv_forward_strides
-conv_backward_fast = conv_backward_strides
+def conv_cols_nbytes(x_shape, w_shape, conv_param, dtype=np.float32):
+    """
+    Size in bytes of the column matrix x_cols that conv_forward_strides and
+    conv_forward_im2col keep in the cache for a layer.
+    """
+    N, C, H, W = x_shape
+    F, _, HH, WW = w_shape
+    stride, pad = conv_param['stride'], conv_param['pad']
+    out_h = (H + 2 * pad - HH) // stride + 1
+    out_w = (W + 2 * pad - WW) // stride + 1
+    return C * HH * WW * N * out_h * out_w * np.dtype(dtype).itemsize
+
+
+def plan_conv_recompute(layers, budget):
+    """
+    Decide for every convolutional layer of a network whether to store its
+    column matrix for the backward pass or to recompute it.
+
+    Rebuilding x_cols costs about as much time per byte for every layer, so
+    this stores as many bytes as fit into the budget: layers are considered
+    from the largest to the smallest x_cols and stored while they fit. Note
+    that the backward pass of a recomputed layer still holds its x_cols
+    transiently.
+
+    Inputs:
+    - layers: List of tuples (x_shape, w_shape, conv_param, dtype), one per
+      convolutional layer.
+    - budget: Number of bytes that may be spent on stored column matrices,
+      or None for no limit.
+
+    Returns:
+    - recompute: List of booleans, one per layer, to be stored in
+      conv_param['recompute'].
+    """
+    sizes = [conv_cols_nbytes(*layer) for layer in layers]
+    if budget is None:
+        return [False] * len(layers)
+    recompute = [True] * len(layers)
+    for i in sorted(range(len(layers)), key=lambda i: -sizes[i]):
+        if sizes[i] <= budget:
+            recompute[i] = False
+            budget -= sizes[i]
+    return recompute
+
+
+# Transformed filters (FFT spectra, ...) are kept here so that repeated calls
+# with unchanged weights, as at test time, skip the transform. Entries are
+# validated against a copy of the weights rather than trusted by identity,
+# since update rules such as sgd modify the weights in place.
+_filter_cache = collections.OrderedDict()
+FILTER_CACHE_SIZE = 16
+
+
+def cached_filter_transform(w, key, transform):
+    """
+    Return transform(w), reusing the result of an earlier call with the same
+    key and weights of equal value.
+
+    Inputs:
+    - w: Filter weights
+    - key: Hashable description of the transform, e.g. ('fft', 32, 32)
+    - transform: Function computing the transform of w
+
+    Returns:
+    - The transformed weights; they must not be modified.
+    """
+    cache_key = (id(w), w.shape, w.dtype.str) + tuple(key)
+    entry = _filter_cache.get(cache_key)
+    if entry is not None and np.array_equal(entry[0], w):
+        _filter_cache.pop(cache_key)
+        _filter_cache[cache_key] = entry
+        return entry[1]
+    result = transform(w)
+    _filter_cache[cache_key] = (w.copy(), result)
+    while len(_filter_cache) > FILTER_CACHE_SIZE:
+        _filter_cache.popitem(last=False)
+    return result
+
+
+def _fft_size(n):
+    """
+    Smallest integer >= n whose prime factors are all 2, 3 or 5, for which
+    FFTs are fast.
+    """
+    best = 1
+    while best < n:
+        best *= 2
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            p = p35
+            while p < n:
+                p *= 2
+            best = min(best, p)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def conv_forward_fft(x, w, b, conv_param):
+    """
+    Forward pass for a convolutional layer computed with FFTs.
+
+    The padded images and the filters are transformed with real 2D FFTs of a
+    common size, the products are summed over channels with one batched
+    complex matrix multiply per frequency, and the result is transformed
+    back. Unlike im2col the memory and the number of multiplies do not grow
+    with the filter size HH * WW, which makes this the best choice for large
+    filters. The filter spectra are computed once for the whole minibatch,
+    kept for the backward pass and cached across calls with
+    cached_filter_transform. For stride > 1 the stride-1 output is computed
+    and subsampled.
+
+    Inputs / outputs: Same as conv_forward_naive
+    """
+    N, C, H, W = x.shape
+    F, _, HH, WW = w.shape
+    stride, pad = conv_param['stride'], conv_param['pad']
+
+    H_pad, W_pad = H + 2 * pad, W + 2 * pad
+    out_h = (H_pad - HH) // stride + 1
+    out_w = (W_pad - WW) // stride + 1
+    size = (_fft_size(H_pad), _fft_size(W_pad))
+
+    p = pad
+    x_padded = np.pad(x, ((0, 0), (0, 0), (p, p), (p, p)), mode='constant')
+    # spectra are stored frequency-major, so that the sum over channels is a
+    # stack of (N, C) x (C, F) matrix products
+    x_hat = np.fft.rfft2(x_padded, s=size).transpose(2, 3, 0, 1)
+    x_hat = np.ascontiguousarray(x_hat)
+    w_hat = cached_filter_transform(
+        w, ('fft',) + size,
+        lambda w: np.ascontiguousarray(
+            np.conj(np.fft.rfft2(w, s=size)).transpose(2, 3, 1, 0)))
+
+    # cross-correlation: out_hat[n, f] = sum_c x_hat[n, c] * conj(w_hat[f, c])
+    out_hat = np.matmul(x_hat, w_hat).transpose(2, 3, 0, 1)
+    out = np.fft.irfft2(out_hat, s=size)
+    out = out[:, :, :(out_h - 1) * stride + 1:stride,
+              :(out_w - 1) * stride + 1:stride]
+    out = out.astype(x.dtype) + b.reshape(1, -1, 1, 1)
+
+    cache = (x, w, b, conv_param, x_hat, w_hat, size)
+    return out, cache
+
+
+def conv_backward_fft(dout, cache):
+    """
+    Backward pass for a convolutional layer computed with FFTs, reusing the
+    spectra of the padded input and of the filters from the forward pass.
+
+    Inputs / outputs: Same as conv_backward_naive
+    """
+    x, w, b, conv_param, x_hat, w_hat, size = cache
+    stride, pad = conv_param['stride'], conv_param['pad']
+    N, C, H, W = x.shape
+    F, _, HH, WW = w.shape
+    H_pad, W_pad = H + 2 * pad, W + 2 * pad
+
+    db = np.sum(dout, axis=(0, 2, 3))
+
+    if stride > 1:
+        # spread dout back onto the stride-1 output grid
+        d = np.zeros((N, F, H_pad - HH + 1, W_pad - WW + 1), dtype=dout.dtype)
+        d[:, :, ::stride, ::stride] = dout
+        dout = d
+    d_hat = np.ascontiguousarray(
+        np.fft.rfft2(dout, s=size).transpose(2, 3, 0, 1))
+
+    # dw[f, c] is the cross-correlation of the padded x with dout, summed
+    # over the minibatch
+    dw_hat = np.matmul(np.conj(d_hat).swapaxes(-1, -2), x_hat)
+    dw = np.fft.irfft2(dw_hat.transpose(2, 3, 0, 1), s=size)[:, :, :HH, :WW]
+    dw = dw.astype(w.dtype)
+
+    # dx is the full convolution of dout with the filters
+    dx_hat = np.matmul(d_hat, np.conj(w_hat).swapaxes(-1, -2))
+    dx = np.fft.irfft2(dx_hat.transpose(2, 3, 0, 1), s=size)
+    dx = dx[:, :, pad:pad + H, pad:pad + W].astype(x.dtype)
+
+    return dx, dw, db
+
+
+# Winograd minimal filtering F(2x2, 3x3): a 2x2 output tile of a 3x3
+# convolution is A^T [(G g G^T) * (B^T d B)] A for the 4x4 input tile d and
+# the filter g, with
+#   B^T = [[1, 0, -1, 0], [0, 1, 1, 0], [0, -1, 1, 0], [0, 1, 0, -1]]
+#   A^T = [[1, 1, 1, 0], [0, 1, -1, -1]]
+# The elementwise product takes 16 multiplies per tile and channel pair
+# instead of the 36 of a direct or im2col convolution. B and A only contain
+# 0 and +-1, so their products are written out as additions below; all
+# transforms act on the two leading axes of their argument.
+WINOGRAD_G = np.array([[1.0, 0.0, 0.0],
+                       [0.5, 0.5, 0.5],
+                       [0.5, -0.5, 0.5],
+                       [0.0, 0.0, 1.0]])
+
+
+def _winograd_bt(d, out):
+    """ out[k] = (B^T d)[k] for a sequence d of 4 arrays """
+    np.subtract(d[0], d[2], out=out[0])
+    np.add(d[1], d[2], out=out[1])
+    np.subtract(d[2], d[1], out=out[2])
+    np.subtract(d[1], d[3], out=out[3])
+
+
+def _winograd_b(d, out):
+    """ out[k] = (B d)[k] for a sequence d of 4 arrays """
+    np.copyto(out[0], d[0])
+    np.subtract(d[1], d[2], out=out[1])
+    out[1] += d[3]
+    np.add(d[1], d[2], out=out[2])
+    out[2] -= d[0]
+    np.negative(d[3], out=out[3])
+
+
+def _winograd_at(m, out):
+    """ out[k] = (A^T m)[k] for a sequence m of 4 arrays """
+    np.add(m[0], m[1], out=out[0])
+    out[0] += m[2]
+    np.subtract(m[1], m[2], out=out[1])
+    out[1] -= m[3]
+
+
+def _winograd_a(y, out):
+    """ out[k] = (A y)[k] for a sequence y of 2 arrays """
+    np.copyto(out[0], y[0])
+    np.add(y[0], y[1], out=out[1])
+    np.subtract(y[0], y[1], out=out[2])
+    np.negative(y[1], out=out[3])
+
+
+def winograd_applicable(w, conv_param):
+    """
+    Whether conv_forward_winograd supports a layer: 3x3 filters, stride 1.
+    """
+    return w.shape[2:] == (3, 3) and conv_param['stride'] == 1
+
+
+def conv_forward_winograd(x, w, b, conv_param):
+    """
+    Forward pass for a 3x3, stride 1 convolutional layer using Winograd's
+    minimal filtering algorithm F(2x2, 3x3).
+
+    The output is split into 2x2 tiles. The overlapping 4x4 input tiles and
+    the filters are transformed, the transformed tiles are multiplied with the
+    transformed filters by matrix multiplies (one per position in the tile
+    and image) that also sum over channels, and the products are transformed
+    back to output tiles. This does 2.25 times fewer multiplies than im2col, and the
+    transformed input (kept for the backward pass) is 4 times the size of x
+    instead of 9 times. The transformed filters are cached with
+    cached_filter_transform.
+
+    Inputs / outputs: Same as conv_forward_naive
+    """
+    if not winograd_applicable(w, conv_param):
+        raise ValueError('Winograd convolution needs 3x3 filters and stride 1')
+    N, C, H, W = x.shape
+    F = w.shape[0]
+    pad = conv_param['pad']
+
+    out_h, out_w = H + 2 * pad - 2, W + 2 * pad - 2
+    th, tw = (out_h + 1) // 2, (out_w + 1) // 2
+    # pad, and round the output up to whole tiles
+    x_padded = np.pad(x, ((0, 0), (0, 0), (pad, pad + 2 * th - out_h),
+                          (pad, pad + 2 * tw - out_w)), mode='constant')
+
+    # Row i of the 4x4 tiles is x_padded[:, :, i::2], column j is [..., j::2].
+    # Transform the rows of all tiles at once, then the columns, which gives
+    # for each of the 16 tile positions a (C, th * tw) matrix per image.
+    rows = np.empty((4, N, C, th, x_padded.shape[3]), dtype=x.dtype)
+    _winograd_bt([x_padded[:, :, i:i + 2 * th:2] for i in range(4)], rows)
+    V = np.empty((4, 4, N, C, th, tw), dtype=x.dtype)
+    for a in range(4):
+        _winograd_bt([rows[a, :, :, :, j:j + 2 * tw:2] for j in range(4)],
+                     V[a])
+    del rows
+    V = V.reshape(16, N, C, th * tw)
+
+    U = cached_filter_transform(
+        w, ('winograd',),
+        lambda w: np.einsum('ai,fcij,bj->abfc', WINOGRAD_G, w,
+                            WINOGRAD_G).astype(w.dtype).reshape(16, F, C))
+
+    M = np.matmul(U[:, np.newaxis], V).reshape(4, 4, N, F, th, tw)
+    Y = np.empty((2, 4, N, F, th, tw), dtype=M.dtype)
+    _winograd_at(M, Y)
+    del M
+    out = np.empty((N, F, 2 * th, 2 * tw), dtype=Y.dtype)
+    for i in range(2):
+        _winograd_at(Y[i], [out[:, :, i::2, j::2] for j in range(2)])
+    out = out[:, :, :out_h, :out_w] + b.reshape(1, -1, 1, 1)
+
+    cache = (x, w, b, conv_param, V, U)
+    return out, cache
+
+
+def conv_backward_winograd(dout, cache):
+    """
+    Backward pass for conv_forward_winograd. The gradients flow back through
+    the same transforms: dM = A dY A^T, dU = dM V^T, dV = U^T dM, then
+    dw = G^T dU G and the input tile gradients B dV B^T are added up over the
+    overlapping tiles.
+
+    Inputs / outputs: Same as conv_backward_naive
+    """
+    x, w, b, conv_param, V, U = cache
+    N, C, H, W = x.shape
+    F = w.shape[0]
+    pad = conv_param['pad']
+    out_h, out_w = dout.shape[2:]
+    th, tw = (out_h + 1) // 2, (out_w + 1) // 2
+
+    db = np.sum(dout, axis=(0, 2, 3))
+
+    dY = np.zeros((N, F, 2 * th, 2 * tw), dtype=dout.dtype)
+    dY[:, :, :out_h, :out_w] = dout
+    cols = np.empty((4, N, F, 2 * th, tw), dtype=dout.dtype)
+    _winograd_a([dY[:, :, :, j::2] for j in range(2)], cols)
+    dM = np.empty((4, 4, N, F, th, tw), dtype=dout.dtype)
+    for c in range(4):
+        _winograd_a([cols[c, :, :, i::2] for i in range(2)], dM[:, c])
+    del cols, dY
+    dM = dM.reshape(16, N, F, th * tw)
+
+    dU = np.matmul(dM, V.swapaxes(2, 3)).sum(axis=1).reshape(4, 4, F, C)
+    dw = np.einsum('ai,abfc,bj->fcij', WINOGRAD_G, dU, WINOGRAD_G)
+    dw = dw.astype(w.dtype)
+
+    dV = np.matmul(U.swapaxes(1, 2)[:, np.newaxis], dM)
+    dV = dV.reshape(4, 4, N, C, th, tw)
+    del dM
+    # B dV B^T gives the gradients of the 4x4 input tiles, which overlap by
+    # two pixels in each direction and are added up
+    d_rows = np.empty((4, 4, N, C, th, tw), dtype=dV.dtype)
+    for a in range(4):
+        _winograd_b(dV[a], d_rows[a])
+    del dV
+    dx_padded = np.zeros((N, C, 2 * th + 2, 2 * tw + 2), dtype=d_rows.dtype)
+    d_tile = np.empty((4, N, C, th, tw), dtype=d_rows.dtype)
+    for j in range(4):
+        _winograd_b(d_rows[:, j], d_tile)
+        for i in range(4):
+            dx_padded[:, :, i:i + 2 * th:2, j:j + 2 * tw:2] += d_tile[i]
+    dx = dx_padded[:, :, pad:pad + H, pad:pad + W]
+
+    return dx, dw, db
+
+
+_conv_methods = {
+  'strides': (conv_forward_strides, conv_backward_strides),
+  'im2col': (conv_forward_im2col, conv_backward_im2col),
+  'fft': (conv_forward_fft, conv_backward_fft),
+  'winograd': (conv_forward_winograd, conv_backward_winograd),
+}
+
+
+class ConvAutoTuner(object):
+    """
+    Picks the fastest convolution method for every layer shape.
+
+    The first time a layer with a given (N, C, H, W, F, HH, WW, stride, pad,
+    dtype) is seen, the forward and backward passes of every method that
+    applies are timed on its actual inputs, and the fastest one is remembered
+    in memory and, if a filename is given, in a JSON file, so later runs and
+    other processes start with the best method right away. Methods that
+    fail, e.g. because the Cython extension is not built, are skipped; stored
+    results naming a method that no longer exists are re-tuned.
+
+    conv_forward_fast uses the module-level conv_tuner when
+    conv_param['method'] is 'auto'; it only writes to a file if the
+    CS231N_CONV_TUNING_FILE environment variable is set.
+    """
+
+    def __init__(self, filename=None, repeats=2):
+        """
+        Inputs:
+        - filename: JSON file with the results, or None to keep them in
+          memory only.
+        - repeats: Number of timed runs per method; the best one counts.
+        """
+        self.filename = filename
+        self.repeats = repeats
+        self.results = None
+
+
+    @staticmethod
+    def key(x, w, conv_param):
+        N, C, H, W = x.shape
+        F, _, HH, WW = w.shape
+        return '%d,%d,%d,%d,%d,%d,%d,%d,%d,%s' % (
+            N, C, H, W, F, HH, WW, conv_param['stride'], conv_param['pad'],
+            np.dtype(x.dtype).name)
+
+
+    def _read(self):
+        if self.filename is None or not os.path.isfile(self.filename):
+            return {}
+        try:
+            with open(self.filename, 'r') as f:
+                results = json.load(f)
+        except (IOError, ValueError):
+            return {}
+        # drop entries of methods that no longer exist, so they are re-tuned
+        return {key: entry for key, entry in results.items()
+                if isinstance(entry, dict)
+                and entry.get('method') in _conv_methods}
+
+
+    def _write(self):
+        if self.filename is None:
+            return
+        # merge with what other processes found in the meantime
+        results = self._read()
+        results.update(self.results)
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        # a unique temporary file, so concurrent writers in other threads or
+        # processes never write into the same one; the last rename wins
+        fd, tmp = tempfile.mkstemp(dir=directory or '.', suffix='.tmp',
+                                   prefix=os.path.basename(self.filename) + '.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(results, f, indent=1, sort_keys=True)
+            os.rename(tmp, self.filename)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.results = results
+
+
+    def benchmark(self, x, w, b, conv_param):
+        """
+        Time the forward plus backward pass of every applicable method.
+
+        Returns:
+        - times: Dictionary mapping method names to seconds
+        """
+        times = {}
+        for method, (forward, backward) in sorted(_conv_methods.items()):
+            if method == 'winograd' and not winograd_applicable(w, conv_param):
+                continue
+            try:
+                out, cache = forward(x, w, b, conv_param)
+                backward(out, cache)
+                best = None
+                for _ in range(self.repeats):
+                    start = time.time()
+                    out, cache = forward(x, w, b, conv_param)
+                    backward(out, cache)
+                    elapsed = time.time() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                times[method] = best
+            except Exception:
+                continue
+        return times
+
+
+    def choose(self, x, w, b, conv_param):
+        """
+        Return the name of the fastest method for this layer, benchmarking
+        it first if its shape has not been seen before.
+        """
+        if self.results is None:
+            self.results = self._read()
+        key = self.key(x, w, conv_param)
+        entry = self.results.get(key)
+        if entry is None or entry.get('method') not in _conv_methods:
+            times = self.benchmark(x, w, b, conv_param)
+            if not times:
+                raise RuntimeError('No convolution method works for ' + key)
+            best = min(times, key=times.get)
+            self.results[key] = {'method': best, 'times': times}
+            self._write()
+        return self.results[key]['method']
+
+
+# The tuning results are only kept in memory unless CS231N_CONV_TUNING_FILE
+# names a JSON file to share them across runs.
+CONV_TUNING_FILE = os.environ.get('CS231N_CONV_TUNING_FILE') or None
+conv_tuner = ConvAutoTuner(CONV_TUNING_FILE)
+
+
+def conv_forward_fast(x, w, b, conv_param):
+    """
+    A fast implementation of the forward pass for a convolutional layer.
+
+    The algorithm is chosen by the optional 'method' key of conv_param:
+    - 'strides' (default): im2col by stride tricks and one matrix multiply
+    - 'im2col': im2col with the Cython extension
+    - 'fft': FFT convolution, best for large filters
+    - 'winograd': Winograd F(2x2, 3x3) for 3x3, stride 1 layers; other layers
+      fall back to 'strides'
+    - 'auto': the fastest of the above for the shape of the layer, see
+      ConvAutoTuner
+
+    Inputs / outputs: Same as conv_forward_naive; the cache records the method
+    so conv_backward_fast can dispatch on it.
+    """
+    method = conv_param.get('method', 'strides')
+    if method == 'auto':
+        method = conv_tuner.choose(x, w, b, conv_param)
+    if method not in _conv_methods:
+        raise ValueError('Unrecognized method "%s"' % method)
+    if method == 'winograd' and not winograd_applicable(w, conv_param):
+        method = 'strides'
+    out, real_cache = _conv_methods[method][0](x, w, b, conv_param)
+    return out, (method, real_cache)
+
+
+def conv_backward_fast(dout, cache):
+    """
+    A fast implementation of the backward pass for a convolutional layer,
+    using the method recorded in the cache by conv_forward_fast.
+    """
+    method, real_cache = cache
+    if method not in _conv_methods:
+        raise ValueError('Unrecognized method "%s"' % method)
+    return _conv_methods[method][1](dout, real_cache)
 
 
 def max_pool_forward_fast(x, pool_param):
     """
     A fast implementation of the forward pass for a max pooling layer.
 
-    This chooses between the reshape method and the im2col method. If the pooling
-    regions are square and tile the input image, then we can use the reshape
-    method which is very fast. Otherwise we fall back on the im2col method, which
-    is not much faster than the naive method.
+    This chooses between the reshape method and the strides method. If the
+    pooling regions are square and tile the input image, then we can use the
+    reshape method which is very fast. Otherwise we fall back on the strides
+    method, which handles overlapping regions and padding.
+
+    pool_param may have an optional 'pad' key giving the number of pixels of
+    padding on every side; padded pixels never win the max.
     """
     N, C, H, W = x.shape
     pool_height, pool_width = pool_param['pool_height'], pool_param['pool_width']
     stride = pool_param['stride']
+    pad = pool_param.get('pad', 0)
 
     same_size = pool_height == pool_width == stride
     tiles = H % pool_height == 0 and W % pool_width == 0
-    if same_size and tiles:
+    if same_size and tiles and pad == 0:
         out, reshape_cache = max_pool_forward_reshape(x, pool_param)
         cache = ('reshape', reshape_cache)
     else:
-        out, im2col_cache = max_pool_forward_im2col(x, pool_param)
-        cache = ('im2col', im2col_cache)
+        out, strides_cache = max_pool_forward_strides(x, pool_param)
+        cache = ('strides', strides_cache)
     return out, cache
 
 
@@ -158,18 +721,109 @@ def max_pool_backward_fast(dout, cache):
     """
     A fast implementation of the backward pass for a max pooling layer.
 
-    This switches between the reshape method an the im2col method depending on
-    which method was used to generate the cache.
+    This switches between the reshape, strides and im2col methods depending
+    on which method was used to generate the cache.
     """
     method, real_cache = cache
     if method == 'reshape':
         return max_pool_backward_reshape(dout, real_cache)
+    elif method == 'strides':
+        return max_pool_backward_strides(dout, real_cache)
     elif method == 'im2col':
         return max_pool_backward_im2col(dout, real_cache)
     else:
         raise ValueError('Unrecognized method "%s"' % method)
 
 
+def _pool_windows(x_padded, pool_height, pool_width, out_height, out_width,
+                  stride):
+    """
+    Strided view of shape (N, C, out_height, out_width, pool_height,
+    pool_width) of the pooling windows of x_padded.
+    """
+    sN, sC, sH, sW = x_padded.strides
+    return np.lib.stride_tricks.as_strided(
+        x_padded,
+        shape=x_padded.shape[:2] + (out_height, out_width, pool_height,
+                                    pool_width),
+        strides=(sN, sC, stride * sH, stride * sW, sH, sW))
+
+
+def max_pool_forward_strides(x, pool_param):
+    """
+    Forward pass for max pooling over a sliding-window view of the input, for
+    any pool size, stride and padding.
+
+    The max and then its position are found with vectorized passes over the
+    positions in the window, so no copy of the windows is made. The cache
+    keeps only the position of the max within every window, as uint8 for
+    windows of up to 256 pixels.
+    """
+    N, C, H, W = x.shape
+    pool_height, pool_width = pool_param['pool_height'], pool_param['pool_width']
+    stride = pool_param['stride']
+    pad = pool_param.get('pad', 0)
+
+    assert (H + 2 * pad - pool_height) % stride == 0, 'Invalid height'
+    assert (W + 2 * pad - pool_width) % stride == 0, 'Invalid width'
+    out_height = (H + 2 * pad - pool_height) // stride + 1
+    out_width = (W + 2 * pad - pool_width) // stride + 1
+
+    x_padded = x
+    if pad > 0:
+        if np.issubdtype(x.dtype, np.floating):
+            fill = -np.inf
+        else:
+            fill = np.iinfo(x.dtype).min
+        x_padded = np.pad(x, ((0, 0), (0, 0), (pad, pad), (pad, pad)),
+                          mode='constant', constant_values=fill)
+    windows = _pool_windows(x_padded, pool_height, pool_width, out_height,
+                            out_width, stride)
+
+    num_positions = pool_height * pool_width
+    arg_dtype = np.uint8 if num_positions <= 256 else np.intp
+    positions = [windows[:, :, :, :, k // pool_width, k % pool_width]
+                 for k in range(num_positions)]
+    out = positions[0].copy()
+    for v in positions[1:]:
+        np.maximum(out, v, out=out)
+    # going backwards, the first position holding the max wins, as in
+    # np.argmax
+    argmax = np.full(out.shape, num_positions - 1, dtype=arg_dtype)
+    for k in range(num_positions - 2, -1, -1):
+        np.copyto(argmax, k, where=(positions[k] == out))
+
+    cache = (x.shape, x.dtype, argmax, pool_param)
+    return out, cache
+
+
+def max_pool_backward_strides(dout, cache):
+    """
+    Backward pass for max_pool_forward_strides. The gradient of every window
+    is scattered to the position of its max; where windows overlap, the
+    contributions are summed.
+    """
+    x_shape, dtype, argmax, pool_param = cache
+    N, C, H, W = x_shape
+    pool_height, pool_width = pool_param['pool_height'], pool_param['pool_width']
+    stride = pool_param['stride']
+    pad = pool_param.get('pad', 0)
+    _, _, out_height, out_width = dout.shape
+
+    dx_padded = np.zeros((N, C, H + 2 * pad, W + 2 * pad),
+                         dtype=np.result_type(dout, dtype))
+    dx_windows = _pool_windows(dx_padded, pool_height, pool_width, out_height,
+                               out_width, stride)
+    # the windows of one position never overlap, so plain += is safe
+    for k in range(pool_height * pool_width):
+        dx_windows[:, :, :, :, k // pool_width, k % pool_width] += \
+            np.where(argmax == k, dout, 0)
+
+    if pad > 0:
+        return dx_padded[:, :, pad:-pad, pad:-pad]
+    return dx_padded
+
+
 def max_pool_forward_reshape(x, pool_param):
     """
     A fast implementation of the forward pass for the max pooling layer that uses
@@ -240,7 +894,7 @@ def max_pool_forward_im2col(x, pool_param):
     out_width = (W - pool_width) // stride + 1
 
     x_split = x.reshape(N * C, 1, H, W)
-    x_cols = im2col(x_split, pool_height, pool_width, padding=0, stride=stride)
+    x_cols = im2col_indices(x_split, pool_height, pool_width, padding=0, stride=stride)
     x_cols_argmax = np.argmax(x_cols, axis=0)
     x_cols_max = x_cols[x_cols_argmax, np.arange(x_cols.shape[1])]
     out = x_cols_max.reshape(out_height, out_width, N, C).transpose(2, 3, 0, 1)
@@ -1,15 +1,102 @@
 from __future__ import print_function
 from builtins import range
 
+import multiprocessing
 import numpy as np
 from random import randrange
 
-def eval_numerical_gradient(f, x, verbose=True, h=0.00001):
+
+# State shared with the worker processes of the parallel gradient checks.
+# It is set before the pool is forked, so every worker inherits its own copy
+# of the function and of the arrays it perturbs in place.
+_worker_state = {}
+
+
+def _eval_coordinates(flat_indices):
+    fn, x, h = _worker_state['fn'], _worker_state['x'], _worker_state['h']
+    grad = np.zeros(len(flat_indices))
+    for n, flat_ix in enumerate(flat_indices):
+        ix = np.unravel_index(flat_ix, x.shape)
+        oldval = x[ix]
+        x[ix] = oldval + h
+        fxph = fn(x)
+        x[ix] = oldval - h
+        fxmh = fn(x)
+        x[ix] = oldval
+        grad[n] = (fxph - fxmh) / (2 * h)
+    return grad
+
+
+def parallel_numerical_gradient(fn, x, flat_indices=None, h=1e-5,
+                                num_workers=None):
+    """
+    Numeric partial derivatives of a scalar function, computed by a pool of
+    worker processes that each handle a share of the coordinates. Workers are
+    forked, so f may be any function (including a lambda) and each worker
+    perturbs its own copy of x and of everything f uses.
+
+    Inputs:
+    - fn: function taking x and returning a scalar
+    - x: the point (numpy array) to evaluate the gradient at
+    - flat_indices: flat indices of the coordinates to evaluate; all of x if
+      None
+    - h: step size
+    - num_workers: number of processes; defaults to the number of CPUs
+
+    Returns:
+    - grad: array of numeric partials, one per entry of flat_indices
+    """
+    if flat_indices is None:
+        flat_indices = np.arange(x.size)
+    flat_indices = np.asarray(flat_indices)
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    if hasattr(multiprocessing, 'get_context'):
+        ctx = multiprocessing.get_context('fork')
+    else:
+        ctx = multiprocessing
+    chunks = [c for c in np.array_split(flat_indices, 4 * num_workers)
+              if len(c)]
+
+    _worker_state.update(fn=fn, x=x, h=h)
+    pool = ctx.Pool(num_workers)
+    try:
+        results = pool.map(_eval_coordinates, chunks)
+    finally:
+        pool.close()
+        pool.join()
+        _worker_state.clear()
+    if not results:
+        return np.zeros(0)
+    return np.concatenate(results)
+
+
+def rel_error_summary(numeric, analytic):
+    """
+    Summarize the elementwise relative error between two gradients.
+
+    Returns a dictionary with the max and mean relative error and the index
+    of the worst element.
+    """
+    numeric, analytic = np.asarray(numeric), np.asarray(analytic)
+    rel_error = (np.abs(numeric - analytic) /
+                 np.maximum(1e-8, np.abs(numeric) + np.abs(analytic)))
+    worst = np.unravel_index(np.argmax(rel_error), rel_error.shape)
+    return {'max_rel_error': float(rel_error.max()),
+            'mean_rel_error': float(rel_error.mean()),
+            'worst_index': tuple(int(i) for i in worst)}
+
+def eval_numerical_gradient(f, x, verbose=True, h=0.00001, num_workers=None):
     """
     a naive implementation of numerical gradient of f at x
     - f should be a function that takes a single argument
     - x is the point (numpy array) to evaluate the gradient at
+    - num_workers: if greater than 1, split the coordinates over this many
+      processes (see parallel_numerical_gradient); nothing is printed then
     """
+    if num_workers is not None and num_workers > 1:
+        grad = parallel_numerical_gradient(f, x, h=h, num_workers=num_workers)
+        return grad.reshape(x.shape).astype(x.dtype)
 
     fx = f(x) # evaluate function value at original point
     grad = np.zeros_like(x)
@@ -35,11 +122,18 @@ def eval_numerical_gradient(f, x, verbose=True, h=0.00001):
     return grad
 
 
-def eval_numerical_gradient_array(f, x, df, h=1e-5):
+def eval_numerical_gradient_array(f, x, df, h=1e-5, num_workers=None):
     """
     Evaluate a numeric gradient for a function that accepts a numpy
     array and returns a numpy array.
+
+    If num_workers is greater than 1 the coordinates are split over that many
+    processes (see parallel_numerical_gradient).
     """
+    if num_workers is not None and num_workers > 1:
+        fn = lambda x: np.sum(f(x) * df)
+        grad = parallel_numerical_gradient(fn, x, h=h, num_workers=num_workers)
+        return grad.reshape(x.shape).astype(x.dtype)
     grad = np.zeros_like(x)
     it = np.nditer(x, flags=['multi_index'], op_flags=['readwrite'])
     while not it.finished:
@@ -57,7 +151,8 @@ def eval_numerical_gradient_array(f, x, df, h=1e-5):
     return grad
 
 
-def eval_numerical_gradient_blobs(f, inputs, output, h=1e-5):
+def eval_numerical_gradient_blobs(f, inputs, output, h=1e-5,
+                                  num_workers=None):
     """
     Compute numeric gradients for a function that operates on input
     and output blobs.
@@ -74,9 +169,20 @@ def eval_numerical_gradient_blobs(f, inputs, output, h=1e-5):
     - inputs: tuple of input blobs
     - output: output blob
     - h: step size
+    - num_workers: if greater than 1, split the coordinates of every input
+      over this many processes (see parallel_numerical_gradient)
     """
     numeric_diffs = []
     for input_blob in inputs:
+        if num_workers is not None and num_workers > 1:
+            def fn(_):
+                f(*(inputs + (output,)))
+                return np.sum(output.vals * output.diffs)
+            diff = parallel_numerical_gradient(fn, input_blob.vals, h=h,
+                                               num_workers=num_workers)
+            diff = diff.reshape(input_blob.vals.shape)
+            numeric_diffs.append(diff.astype(input_blob.diffs.dtype))
+            continue
         diff = np.zeros_like(input_blob.diffs)
         it = np.nditer(input_blob.vals, flags=['multi_index'],
                        op_flags=['readwrite'])
@@ -104,11 +210,29 @@ def eval_numerical_gradient_net(net, inputs, output, h=1e-5):
                 inputs, output, h=h)
 
 
-def grad_check_sparse(f, x, analytic_grad, num_checks=10, h=1e-5):
+def grad_check_sparse(f, x, analytic_grad, num_checks=10, h=1e-5,
+                      num_workers=None):
     """
     sample a few random elements and only return numerical
     in this dimensions.
+
+    If num_workers is greater than 1, the sampled elements are evaluated by
+    that many processes and a relative error summary (see rel_error_summary)
+    is printed and returned instead of one line per element.
     """
+    if num_workers is not None and num_workers > 1:
+        ixs = [tuple([randrange(m) for m in x.shape])
+               for i in range(num_checks)]
+        flat_ixs = [np.ravel_multi_index(ix, x.shape) for ix in ixs]
+        grad_numerical = parallel_numerical_gradient(f, x, flat_ixs, h=h,
+                                                     num_workers=num_workers)
+        grad_analytic = np.array([analytic_grad[ix] for ix in ixs])
+        summary = rel_error_summary(grad_numerical, grad_analytic)
+        summary['worst_index'] = ixs[summary['worst_index'][0]]
+        print('%d checks, max relative error: %e, mean relative error: %e'
+              % (num_checks, summary['max_rel_error'],
+                 summary['mean_rel_error']))
+        return summary
 
     for i in range(num_checks):
         ix = tuple([randrange(m) for m in x.shape])
@@ -126,3 +250,112 @@ def grad_check_sparse(f, x, analytic_grad, num_checks=10, h=1e-5):
                     (abs(grad_numerical) + abs(grad_analytic)))
         print('numerical: %f analytic: %f, relative error: %e'
               %(grad_numerical, grad_analytic, rel_error))
+
+
+def eval_numerical_gradient_array_grouped(f, x, df, independent_axes=(0,),
+                                          h=1e-5):
+    """
+    Evaluate a numeric gradient like eval_numerical_gradient_array, but
+    perturb structurally independent coordinates together.
+
+    An axis of x is independent if it also appears, with the same size and
+    position, in the output of f and out[..., i, ...] only depends on
+    x[..., i, ...]; the batch axis of most layers is, and for elementwise
+    functions (ReLU, seeded dropout) every axis is. All coordinates that only
+    differ along independent axes are perturbed in the same forward pass, and
+    their contributions are separated by summing over the other axes of the
+    output. This needs 2 * prod(size of the other axes) forward passes
+    instead of 2 * x.size.
+
+    Inputs:
+    - f: function that accepts a numpy array and returns a numpy array
+    - x: the point (numpy array) to evaluate the gradient at
+    - df: upstream gradient, of the shape of f(x)
+    - independent_axes: axes of x (and of f(x)) that are independent
+    - h: step size
+    """
+    grad = np.zeros_like(x)
+    axes = sorted(a % x.ndim for a in independent_axes)
+    other_axes = [a for a in range(x.ndim) if a not in axes]
+    other_shape = [x.shape[a] for a in other_axes]
+    reduce_axes = tuple(a for a in range(df.ndim) if a not in axes)
+
+    for other_idx in np.ndindex(*other_shape):
+        ix = [slice(None)] * x.ndim
+        for a, i in zip(other_axes, other_idx):
+            ix[a] = i
+        ix = tuple(ix)
+
+        oldval = x[ix].copy()
+        x[ix] = oldval + h
+        pos = f(x).copy()
+        x[ix] = oldval - h
+        neg = f(x).copy()
+        x[ix] = oldval
+
+        grad[ix] = np.sum((pos - neg) * df, axis=reduce_axes) / (2 * h)
+    return grad
+
+
+def grad_check_directional(f, x, analytic_grad, df=None, num_checks=10,
+                           h=1e-5, seed=None, verbose=True):
+    """
+    Check a whole gradient with a few random directional derivatives
+    (simultaneous perturbation, as in SPSA) instead of one coordinate at a
+    time. Each check costs two evaluations of f whatever the size of x.
+
+    For a random direction v with entries +-1 the centered difference
+    (f(x + h v) - f(x - h v)) / (2 h) must match the dot product of the
+    analytic gradient with v. Since E[(v . e)^2] = ||e||^2 for such v, the
+    root mean square of the differences estimates the norm of the gradient
+    error, which gives an estimate of the relative error of the whole
+    gradient.
+
+    Inputs:
+    - f: function of x returning a scalar or, if df is given, an array
+    - x: the point (numpy array) to evaluate the gradient at
+    - analytic_grad: the gradient to check, of the shape of x
+    - df: if not None, the upstream gradient of f(x); the checked quantity is
+      then np.sum(f(x) * df), as in eval_numerical_gradient_array
+    - num_checks: number of random directions
+    - h: step size
+    - seed: seed for the random directions
+    - verbose: if True, print one line per direction and a summary
+
+    Returns:
+    - rel_error: estimate of ||numeric - analytic|| / (||numeric|| +
+      ||analytic||) over the whole gradient
+    """
+    rng = np.random.RandomState(seed)
+    if df is None:
+        fn = f
+    else:
+        fn = lambda x: np.sum(f(x) * df)
+
+    x0 = x.copy()
+    diffs, numerics = [], []
+    for i in range(num_checks):
+        v = rng.randint(0, 2, size=x.shape) * 2 - 1
+        x[...] = x0 + h * v
+        fxph = fn(x)
+        x[...] = x0 - h * v
+        fxmh = fn(x)
+        x[...] = x0
+
+        grad_numerical = (fxph - fxmh) / (2 * h)
+        grad_analytic = np.sum(analytic_grad * v)
+        diffs.append(grad_numerical - grad_analytic)
+        numerics.append(grad_numerical)
+        if verbose:
+            rel_error = (abs(grad_numerical - grad_analytic) /
+                        (abs(grad_numerical) + abs(grad_analytic) + 1e-300))
+            print('direction %d numerical: %f analytic: %f, relative error: %e'
+                  % (i, grad_numerical, grad_analytic, rel_error))
+
+    err_norm = np.sqrt(np.mean(np.square(diffs)))
+    num_norm = np.sqrt(np.mean(np.square(numerics)))
+    rel_error = err_norm / max(num_norm + np.linalg.norm(analytic_grad), 1e-300)
+    if verbose:
+        print('estimated gradient relative error over %d directions: %e'
+              % (num_checks, rel_error))
+    return rel_error
@@ -0,0 +1,133 @@
+from __future__ import print_function
+import time
+
+import numpy as np
+
+from cs231n import im2col_cython
+from cs231n.im2col import im2col_numpy
+
+
+# (N, C, H, W, filter size, stride, pad) of typical layers
+COL2IM_SHAPES = [
+    (100, 3, 32, 32, 7, 1, 3),
+    (100, 32, 32, 32, 3, 1, 1),
+    (100, 64, 16, 16, 3, 1, 1),
+    (100, 128, 8, 8, 3, 2, 1),
+]
+
+
+# (N, C, H, W, filter size, stride, pad) of CIFAR-10 and Tiny ImageNet
+# layers
+IM2COL_SHAPES = [
+    (100, 3, 32, 32, 7, 1, 3),
+    (100, 32, 32, 32, 3, 1, 1),
+    (100, 64, 16, 16, 3, 1, 1),
+    (100, 128, 8, 8, 3, 2, 1),
+    (64, 3, 64, 64, 3, 1, 1),
+    (64, 64, 32, 32, 3, 1, 1),
+]
+
+
+def _best_time(f, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.time()
+        f()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_col2im(shapes=None, thread_counts=None, dtype=np.float32,
+                     repeats=3):
+    """
+    Time col2im_cython and col2im_6d_cython with different numbers of
+    threads and print the speedup over the serial path.
+
+    Inputs:
+    - shapes: List of (N, C, H, W, filter size, stride, pad); defaults to
+      COL2IM_SHAPES.
+    - thread_counts: Thread counts to compare against the serial path;
+      defaults to the current setting of im2col_cython.set_num_threads.
+    - dtype: Datatype of the columns.
+    - repeats: Number of timed runs; the best one counts.
+
+    Returns:
+    - results: List of (shape, function name, num_threads, seconds)
+    """
+    if shapes is None:
+        shapes = COL2IM_SHAPES
+    saved = im2col_cython.get_num_threads()
+    if thread_counts is None:
+        thread_counts = [saved]
+    results = []
+    try:
+        for shape in shapes:
+            N, C, H, W, k, stride, pad = shape
+            out_h = (H + 2 * pad - k) // stride + 1
+            out_w = (W + 2 * pad - k) // stride + 1
+            cols = np.random.randn(C * k * k, N * out_h * out_w).astype(dtype)
+            cols_6d = cols.reshape(C, k, k, N, out_h, out_w)
+            funcs = [
+              ('col2im_cython', lambda: im2col_cython.col2im_cython(
+                  cols, N, C, H, W, k, k, pad, stride)),
+              ('col2im_6d_cython', lambda: im2col_cython.col2im_6d_cython(
+                  cols_6d, N, C, H, W, k, k, pad, stride)),
+            ]
+            for name, f in funcs:
+                serial = None
+                for t in [1] + [t for t in thread_counts if t != 1]:
+                    im2col_cython.set_num_threads(t)
+                    elapsed = _best_time(f, repeats)
+                    if serial is None:
+                        serial = elapsed
+                    results.append((shape, name, t, elapsed))
+                    print('%-18s %-28s threads %2d: %8.2f ms  speedup %.2fx'
+                          % (name, shape, t, 1000 * elapsed,
+                             serial / elapsed))
+    finally:
+        im2col_cython.set_num_threads(saved)
+    return results
+
+
+def benchmark_im2col(shapes=None, num_filters=64, dtype=np.float32,
+                     repeats=3):
+    """
+    Time im2col_cython against the NumPy version and against the matrix
+    multiply of a forward pass with num_filters filters that consumes its
+    output, and print the share of im2col in that forward pass.
+
+    Inputs:
+    - shapes: List of (N, C, H, W, filter size, stride, pad); defaults to
+      IM2COL_SHAPES.
+    - num_filters: Number of filters of the matrix multiply.
+    - dtype: Datatype of the input.
+    - repeats: Number of timed runs; the best one counts.
+
+    Returns:
+    - results: List of (shape, cython seconds, numpy seconds, matmul seconds)
+    """
+    if shapes is None:
+        shapes = IM2COL_SHAPES
+    results = []
+    for shape in shapes:
+        N, C, H, W, k, stride, pad = shape
+        x = np.random.randn(N, C, H, W).astype(dtype)
+        w = np.random.randn(num_filters, C * k * k).astype(dtype)
+        cols = im2col_cython.im2col_cython(x, k, k, pad, stride)
+        t_cython = _best_time(
+            lambda: im2col_cython.im2col_cython(x, k, k, pad, stride), repeats)
+        t_numpy = _best_time(lambda: im2col_numpy(x, k, k, pad, stride),
+                             repeats)
+        t_matmul = _best_time(lambda: w.dot(cols), repeats)
+        results.append((shape, t_cython, t_numpy, t_matmul))
+        print('%-28s cython %8.2f ms  numpy %8.2f ms  matmul %8.2f ms  '
+              'im2col share %3.0f%%'
+              % (shape, 1000 * t_cython, 1000 * t_numpy, 1000 * t_matmul,
+                 100 * t_cython / (t_cython + t_matmul)))
+    return results
+
+
+if __name__ == '__main__':
+    benchmark_im2col()
+    benchmark_col2im()
@@ -1,6 +1,10 @@
+import multiprocessing
+import os
+
 import numpy as np
 cimport numpy as np
 cimport cython
+from cython.parallel cimport prange
 
 # DTYPE = np.float64
 # ctypedef np.float64_t DTYPE_t
@@ -9,6 +13,32 @@ ctypedef fused DTYPE_t:
     np.float32_t
     np.float64_t
 
+
+# Number of threads used by the col2im scatters. The work is split over the
+# batch and the channels, so no two threads ever add to the same pixel.
+# 1 runs the serial loops; without OpenMP support at build time prange runs
+# serially anyway.
+def _cpu_count():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+cdef int _num_threads = max(1, int(os.environ.get('CS231N_NUM_THREADS',
+                                                  _cpu_count())))
+
+
+def set_num_threads(int num_threads):
+    """ Set the number of threads used by col2im_cython and col2im_6d_cython """
+    global _num_threads
+    _num_threads = max(1, num_threads)
+
+
+def get_num_threads():
+    return _num_threads
+
+
 def im2col_cython(np.ndarray[DTYPE_t, ndim=4] x, int field_height,
                   int field_width, int padding, int stride):
     cdef int N = x.shape[0]
@@ -16,105 +46,194 @@ def im2col_cython(np.ndarray[DTYPE_t, ndim=4] x, int field_height,
     cdef int H = x.shape[2]
     cdef int W = x.shape[3]
     
-    cdef int HH = (H + 2 * padding - field_height) / stride + 1
-    cdef int WW = (W + 2 * padding - field_width) / stride + 1
+    cdef int HH = (H + 2 * padding - field_height) // stride + 1
+    cdef int WW = (W + 2 * padding - field_width) // stride + 1
 
+    # Pad into a (C, H, W, N) copy of x: the columns are stored with the
+    # image index fastest, so every run of cols is then a contiguous run of
+    # this array as well. The copy is much smaller than cols.
     cdef int p = padding
-    cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.pad(x,
-            ((0, 0), (0, 0), (p, p), (p, p)), mode='constant')
+    cdef DTYPE_t[:, :, :, ::1] x_padded = np.zeros(
+            (C, H + 2 * p, W + 2 * p, N), dtype=x.dtype)
+    cdef const DTYPE_t[:, :, :, :] x_view = x
+    pad_transpose_inner(x_view, x_padded, N, C, H, W, p)
 
-    cdef np.ndarray[DTYPE_t, ndim=2] cols = np.zeros(
+    # every entry is written by the kernel
+    cdef np.ndarray[DTYPE_t, ndim=2] cols = np.empty(
             (C * field_height * field_width, N * HH * WW),
             dtype=x.dtype)
+    cdef DTYPE_t[:, ::1] cols_view = cols
 
-    # Moving the inner loop to a C function with no bounds checking works, but does
-    # not seem to help performance in any measurable way.
-
-    im2col_cython_inner(cols, x_padded, N, C, H, W, HH, WW,
+    im2col_cython_inner(cols_view, x_padded, N, C, H, W, HH, WW,
                         field_height, field_width, padding, stride)
     return cols
 
 
+cdef enum:
+    TRANSPOSE_BLOCK = 16
+
+
 @cython.boundscheck(False)
-cdef int im2col_cython_inner(np.ndarray[DTYPE_t, ndim=2] cols,
-                             np.ndarray[DTYPE_t, ndim=4] x_padded,
+@cython.wraparound(False)
+cdef int pad_transpose_inner(const DTYPE_t[:, :, :, :] x,
+                             DTYPE_t[:, :, :, ::1] x_padded,
+                             int N, int C, int H, int W, int p) except? -1:
+    # x_padded[c, h + p, w + p, i] = x[i, c, h, w], transposing every (N, W)
+    # slice in square tiles so that both sides stay in cache
+    cdef int c, h, i, w, i0, w0, i1, w1
+
+    for c in range(C):
+        for h in range(H):
+            for i0 in range(0, N, TRANSPOSE_BLOCK):
+                i1 = min(i0 + TRANSPOSE_BLOCK, N)
+                for w0 in range(0, W, TRANSPOSE_BLOCK):
+                    w1 = min(w0 + TRANSPOSE_BLOCK, W)
+                    for w in range(w0, w1):
+                        for i in range(i0, i1):
+                            x_padded[c, h + p, w + p, i] = x[i, c, h, w]
+    return 0
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int im2col_cython_inner(DTYPE_t[:, ::1] cols,
+                             DTYPE_t[:, :, :, ::1] x_padded,
                              int N, int C, int H, int W, int HH, int WW,
                              int field_height, int field_width, int padding, int stride) except? -1:
-    cdef int c, ii, jj, row, yy, xx, i, col
+    # x_padded has shape (C, H + 2 * padding, W + 2 * padding, N). For a tap
+    # (c, ii, jj) and an output row yy the columns are a (WW, N) block that
+    # is read from a single image row: contiguous for stride 1, contiguous
+    # runs of N otherwise.
+    cdef int c, ii, jj, row, yy, xx, i, col, y, x0
+    cdef DTYPE_t *dst
+    cdef DTYPE_t *src
 
     for c in range(C):
-        for yy in range(HH):
-            for xx in range(WW):
-                for ii in range(field_height):
-                    for jj in range(field_width):
-                        row = c * field_width * field_height + ii * field_height + jj
-                        for i in range(N):
-                            col = yy * WW * N + xx * N + i
-                            cols[row, col] = x_padded[i, c, stride * yy + ii, stride * xx + jj]
-
+        for ii in range(field_height):
+            for jj in range(field_width):
+                row = c * field_width * field_height + ii * field_width + jj
+                for yy in range(HH):
+                    y = stride * yy + ii
+                    col = yy * WW * N
+                    if stride == 1:
+                        dst = &cols[row, col]
+                        src = &x_padded[c, y, jj, 0]
+                        for i in range(WW * N):
+                            dst[i] = src[i]
+                    else:
+                        for xx in range(WW):
+                            x0 = stride * xx + jj
+                            dst = &cols[row, col + xx * N]
+                            src = &x_padded[c, y, x0, 0]
+                            for i in range(N):
+                                dst[i] = src[i]
+    return 0
 
 
 def col2im_cython(np.ndarray[DTYPE_t, ndim=2] cols, int N, int C, int H, int W,
                   int field_height, int field_width, int padding, int stride):
     cdef np.ndarray x = np.empty((N, C, H, W), dtype=cols.dtype)
-    cdef int HH = (H + 2 * padding - field_height) / stride + 1
-    cdef int WW = (W + 2 * padding - field_width) / stride + 1
+    cdef int HH = (H + 2 * padding - field_height) // stride + 1
+    cdef int WW = (W + 2 * padding - field_width) // stride + 1
     cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.zeros((N, C, H + 2 * padding, W + 2 * padding),
                                         dtype=cols.dtype)
+    cdef const DTYPE_t[:, :] cols_view = cols
+    cdef DTYPE_t[:, :, :, ::1] x_padded_view = x_padded
 
     # Moving the inner loop to a C-function with no bounds checking improves
     # performance quite a bit for col2im.
-    col2im_cython_inner(cols, x_padded, N, C, H, W, HH, WW, 
-                        field_height, field_width, padding, stride)
+    col2im_cython_inner(cols_view, x_padded_view, N, C, H, W, HH, WW, 
+                        field_height, field_width, padding, stride,
+                        _num_threads)
     if padding > 0:
         return x_padded[:, :, padding:-padding, padding:-padding]
     return x_padded
 
 
 @cython.boundscheck(False)
-cdef int col2im_cython_inner(np.ndarray[DTYPE_t, ndim=2] cols,
-                             np.ndarray[DTYPE_t, ndim=4] x_padded,
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef int col2im_cython_inner(const DTYPE_t[:, :] cols,
+                             DTYPE_t[:, :, :, ::1] x_padded,
                              int N, int C, int H, int W, int HH, int WW,
-                             int field_height, int field_width, int padding, int stride) except? -1:
-    cdef int c, ii, jj, row, yy, xx, i, col
+                             int field_height, int field_width, int padding, int stride,
+                             int num_threads) except? -1:
+    cdef int c, ii, jj, row, yy, xx, i, col, nc, nblocks, block, n0, n1
 
-    for c in range(C):
+    if num_threads <= 1:
+        for c in range(C):
+            for ii in range(field_height):
+                for jj in range(field_width):
+                    row = c * field_width * field_height + ii * field_width + jj
+                    for yy in range(HH):
+                        for xx in range(WW):
+                            for i in range(N):
+                                col = yy * WW * N + xx * N + i
+                                x_padded[i, c, stride * yy + ii, stride * xx + jj] += cols[row, col]
+        return 0
+
+    # cols is stored with n fastest, so every thread takes a channel and a
+    # contiguous block of the batch and keeps n as the innermost loop
+    nblocks = min(N, num_threads)
+    block = (N + nblocks - 1) // nblocks
+    for nc in prange(C * nblocks, nogil=True, num_threads=num_threads, schedule='static'):
+        c = nc // nblocks
+        n0 = (nc % nblocks) * block
+        n1 = min(n0 + block, N)
         for ii in range(field_height):
             for jj in range(field_width):
-                row = c * field_width * field_height + ii * field_height + jj
+                row = c * field_width * field_height + ii * field_width + jj
                 for yy in range(HH):
                     for xx in range(WW):
-                        for i in range(N):
-                            col = yy * WW * N + xx * N + i
-                            x_padded[i, c, stride * yy + ii, stride * xx + jj] += cols[row, col]
+                        col = yy * WW * N + xx * N
+                        for i in range(n0, n1):
+                            x_padded[i, c, stride * yy + ii, stride * xx + jj] += cols[row, col + i]
+    return 0
 
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cdef col2im_6d_cython_inner(np.ndarray[DTYPE_t, ndim=6] cols,
-                            np.ndarray[DTYPE_t, ndim=4] x_padded,
-                            int N, int C, int H, int W, int HH, int WW,
-                            int out_h, int out_w, int pad, int stride):
-
-    cdef int c, hh, ww, n, h, w
-    for n in range(N):
-        for c in range(C):
-            for hh in range(HH):
-                for ww in range(WW):
-                    for h in range(out_h):
-                        for w in range(out_w):
-                            x_padded[n, c, stride * h + hh, stride * w + ww] += cols[c, hh, ww, n, h, w]
+@cython.cdivision(True)
+cdef int col2im_6d_cython_inner(const DTYPE_t[:, :, :, :, :, :] cols,
+                                DTYPE_t[:, :, :, ::1] x_padded,
+                                int N, int C, int H, int W, int HH, int WW,
+                                int out_h, int out_w, int pad, int stride,
+                                int num_threads) except? -1:
+
+    cdef int c, hh, ww, n, h, w, nc
+    if num_threads <= 1:
+        for n in range(N):
+            for c in range(C):
+                for hh in range(HH):
+                    for ww in range(WW):
+                        for h in range(out_h):
+                            for w in range(out_w):
+                                x_padded[n, c, stride * h + hh, stride * w + ww] += cols[c, hh, ww, n, h, w]
+        return 0
+
+    for nc in prange(N * C, nogil=True, num_threads=num_threads, schedule='static'):
+        n = nc // C
+        c = nc % C
+        for hh in range(HH):
+            for ww in range(WW):
+                for h in range(out_h):
+                    for w in range(out_w):
+                        x_padded[n, c, stride * h + hh, stride * w + ww] += cols[c, hh, ww, n, h, w]
+    return 0
     
 
 def col2im_6d_cython(np.ndarray[DTYPE_t, ndim=6] cols, int N, int C, int H, int W,
         int HH, int WW, int pad, int stride):
     cdef np.ndarray x = np.empty((N, C, H, W), dtype=cols.dtype)
-    cdef int out_h = (H + 2 * pad - HH) / stride + 1
-    cdef int out_w = (W + 2 * pad - WW) / stride + 1
+    cdef int out_h = (H + 2 * pad - HH) // stride + 1
+    cdef int out_w = (W + 2 * pad - WW) // stride + 1
     cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.zeros((N, C, H + 2 * pad, W + 2 * pad),
                                                   dtype=cols.dtype)
+    cdef const DTYPE_t[:, :, :, :, :, :] cols_view = cols
+    cdef DTYPE_t[:, :, :, ::1] x_padded_view = x_padded
 
-    col2im_6d_cython_inner(cols, x_padded, N, C, H, W, HH, WW, out_h, out_w, pad, stride)
+    col2im_6d_cython_inner(cols_view, x_padded_view, N, C, H, W, HH, WW, out_h, out_w, pad, stride,
+                           _num_threads)
 
     if pad > 0:
         return x_padded[:, :, pad:-pad, pad:-pad]
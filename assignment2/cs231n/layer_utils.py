@@ -1,3 +1,5 @@
+import numpy as np
+
 from cs231n.layers import *
 from cs231n.fast_layers import *
 
@@ -30,6 +32,96 @@ def affine_relu_backward(dout, cache):
     return dx, dw, db
 
 
+def affine_bn_relu_forward(x, w, b, gamma, beta, bn_param, ws=None):
+    """
+    Fused affine - batchnorm - ReLU layer.
+
+    This computes the same values as affine_forward, batchnorm_forward and
+    relu_forward in sequence, but normalizes the affine output in place and
+    keeps only the normalized activations and the per-feature inverse
+    standard deviation for the backward pass; the ReLU mask is recomputed from
+    them. The composed layers would cache the affine output, the centered and
+    the normalized activations and the batchnorm output.
+
+    Inputs:
+    - x: Input to the affine layer, of shape (N, d_1, ..., d_k)
+    - w, b: Weights for the affine layer
+    - gamma, beta: Scale and shift parameters of the batchnorm layer
+    - bn_param: Batchnorm parameters, see batchnorm_forward
+    - ws: Optional Workspace for the affine and ReLU outputs
+
+    Returns a tuple of:
+    - out: Output from the ReLU, of shape (N, M)
+    - cache: Object to give to the backward pass
+    """
+    mode = bn_param['mode']
+    eps = bn_param.get('eps', 1e-5)
+    momentum = bn_param.get('momentum', 0.9)
+
+    N, D = x.shape[0], w.shape[1]
+    a, _ = affine_forward(x, w, b,
+                          out=get_buffer(ws, (N, D), np.result_type(x, w)))
+    running_mean = bn_param.get('running_mean', np.zeros(D, dtype=a.dtype))
+    running_var = bn_param.get('running_var', np.zeros(D, dtype=a.dtype))
+
+    if mode == 'train':
+        # a becomes the normalized activations
+        _, _, batch_mean, batch_var, x_std_inv = \
+            batchnorm_normalize(a, eps, out=a)
+        x_std_inv = x_std_inv.astype(a.dtype)[np.newaxis, :]
+        running_mean, running_var = batchnorm_running_update(
+            running_mean, running_var, batch_mean, batch_var, momentum,
+            a.dtype)
+    elif mode == 'test':
+        x_std_inv = None
+        a -= running_mean[None, :]
+        a /= np.sqrt(running_var[None, :]+eps)
+    else:
+        raise ValueError('Invalid forward batchnorm mode "%s"' % mode)
+    bn_param['running_mean'] = running_mean
+    bn_param['running_var'] = running_var
+
+    out = np.multiply(gamma[np.newaxis, :], a,
+                      out=get_buffer(ws, a.shape,
+                                     np.result_type(gamma, a)))
+    out += beta[np.newaxis, :]
+    out[out < 1e-9] = 0
+    cache = (x, w, a, x_std_inv, gamma, beta)
+    return out, cache
+
+
+def affine_bn_relu_backward(dout, cache, ws=None):
+    """
+    Backward pass for the fused affine-bn-relu layer. The gradients are
+    identical to those of relu_backward, batchnorm_backward_alt and
+    affine_backward in sequence.
+
+    Returns a tuple of:
+    - dx: Gradient with respect to x
+    - dw, db: Gradients with respect to the affine parameters
+    - dgamma, dbeta: Gradients with respect to the batchnorm parameters
+    """
+    x, w, x_norm, x_std_inv, gamma, beta = cache
+    # recompute the ReLU mask from the normalized activations
+    y = gamma[np.newaxis, :]*x_norm
+    y += beta[np.newaxis, :]
+    dy = np.multiply(dout, ~(y < 1e-9),
+                     out=get_buffer(ws, dout.shape, dout.dtype))
+    del y
+
+    dgamma = np.sum(dy*x_norm, axis=0)
+    dbeta = np.sum(dy, axis=0)
+    dx_norm = dy * gamma
+    n = x_norm.shape[0]
+    da = x_std_inv/n * (dx_norm*n - dx_norm.sum(axis=0, keepdims=True) -
+                        x_norm*(dx_norm*x_norm).sum(axis=0, keepdims=True))
+
+    dx, dw, db = affine_backward(
+        da, (x, w, None),
+        out=get_buffer(ws, x.shape, np.result_type(da, w)))
+    return dx, dw, db, dgamma, dbeta
+
+
 def conv_relu_forward(x, w, b, conv_param):
     """
     A convenience layer that performs a convolution followed by a ReLU.
@@ -3,7 +3,99 @@ import numpy as np
 from itertools import product
 
 
-def affine_forward(x, w, b):
+class Workspace(object):
+    """
+    A pool of preallocated arrays keyed by (shape, dtype), used to pass out=
+    buffers to the layer functions so that a model allocates its activations
+    and intermediate gradients once instead of on every iteration.
+
+    Within one iteration every call to get() returns a different array; after
+    reset() the same sequence of calls returns the same arrays again. Arrays
+    obtained from a workspace are only valid until the next reset(), so they
+    must not be returned to the caller of a model (scores, grads).
+    """
+
+    def __init__(self):
+        self._pool = {}
+        self._count = {}
+
+    def get(self, shape, dtype):
+        """ Return an uninitialized array of the given shape and dtype. """
+        key = (tuple(shape), np.dtype(dtype))
+        arrays = self._pool.setdefault(key, [])
+        i = self._count.get(key, 0)
+        if i == len(arrays):
+            arrays.append(np.empty(key[0], dtype=key[1]))
+        self._count[key] = i + 1
+        return arrays[i]
+
+    def reset(self):
+        """ Make all arrays available again; call once per iteration. """
+        self._count = {}
+
+    def nbytes(self):
+        """ Total size of the pooled arrays. """
+        return sum(a.nbytes for arrays in self._pool.values() for a in arrays)
+
+    def __getstate__(self):
+        # The buffers are scratch space; don't pickle them with the model.
+        return {'_pool': {}, '_count': {}}
+
+
+def get_buffer(ws, shape, dtype):
+    """
+    Return ws.get(shape, dtype), or None if no workspace is used; the result
+    can be passed directly as the out argument of a layer function.
+    """
+    if ws is None:
+        return None
+    return ws.get(shape, dtype)
+
+
+def store_mask(mask, cache_mode):
+    """
+    Store a boolean mask in a cache.
+
+    Inputs:
+    - mask: Boolean array.
+    - cache_mode: 'mask' to keep the array as is (1 byte per element) or
+      'packed' to pack it with np.packbits (1 bit per element).
+
+    Returns:
+    - stored: Object to pass to load_mask.
+    """
+    if cache_mode == 'mask':
+        return ('mask', mask)
+    elif cache_mode == 'packed':
+        return ('packed', np.packbits(mask, axis=None), mask.shape)
+    raise ValueError('Invalid mask cache mode "%s"' % cache_mode)
+
+
+def load_mask(stored):
+    """
+    Inverse of store_mask; returns the boolean mask.
+    """
+    if stored[0] == 'mask':
+        return stored[1]
+    _, bits, shape = stored
+    size = int(np.prod(shape))
+    return np.unpackbits(bits)[:size].view(np.bool_).reshape(shape)
+
+
+def random_keep_mask(shape, p):
+    """
+    Draw a boolean mask that is True with probability 1 - p, by comparing
+    random 32 bit integers against a threshold. This is several times faster
+    than np.random.rand(*shape) > p and never materializes a float array. It
+    uses the global numpy random state, so np.random.seed makes it
+    deterministic.
+    """
+    threshold = np.uint32(min(int(p * 2 ** 32), 2 ** 32 - 1))
+    draws = np.random.randint(0, 2 ** 32, size=shape, dtype=np.uint32)
+    return draws >= threshold
+
+
+def affine_forward(x, w, b, out=None):
     """
     Computes the forward pass for an affine (fully-connected) layer.
 
@@ -16,18 +108,23 @@ def affine_forward(x, w, b):
     - x: A numpy array containing input data, of shape (N, d_1, ..., d_k)
     - w: A numpy array of weights, of shape (D, M)
     - b: A numpy array of biases, of shape (M,)
+    - out: Optional preallocated output array of shape (N, M) and of the
+      dtype of np.dot(x, w)
 
     Returns a tuple of:
     - out: output, of shape (N, M)
     - cache: (x, w, b)
     """
-    out = None
     ###########################################################################
     # TODO: Implement the affine forward pass. Store the result in out. You   #
     # will need to reshape the input into rows.                               #
     ###########################################################################
     x_tmp = x.reshape((x.shape[0], -1))
-    out = np.dot(x_tmp, w) + b[np.newaxis, :]
+    if out is None:
+        out = np.dot(x_tmp, w) + b[np.newaxis, :]
+    else:
+        np.dot(x_tmp, w, out=out)
+        out += b[np.newaxis, :]
     ###########################################################################
     #                             END OF YOUR CODE                            #
     ###########################################################################
@@ -35,7 +132,7 @@ def affine_forward(x, w, b):
     return out, cache
 
 
-def affine_backward(dout, cache):
+def affine_backward(dout, cache, out=None):
     """
     Computes the backward pass for an affine layer.
 
@@ -44,6 +141,7 @@ def affine_backward(dout, cache):
     - cache: Tuple of:
       - x: Input data, of shape (N, d_1, ... d_k)
       - w: Weights, of shape (D, M)
+    - out: Optional preallocated array for dx, of the shape of x
 
     Returns a tuple of:
     - dx: Gradient with respect to x, of shape (N, d1, ..., d_k)
@@ -56,7 +154,11 @@ def affine_backward(dout, cache):
     # TODO: Implement the affine backward pass.                               #
     ###########################################################################
     x_tmp = x.reshape((x.shape[0], -1))
-    dx = dout.dot(w.T).reshape(x.shape)
+    if out is None:
+        dx = dout.dot(w.T).reshape(x.shape)
+    else:
+        np.dot(dout, w.T, out=out.reshape((x.shape[0], -1)))
+        dx = out
     dw = x_tmp.T.dot(dout)
     db = np.sum(dout, axis=0)
     ###########################################################################
@@ -65,54 +167,187 @@ def affine_backward(dout, cache):
     return dx, dw, db
 
 
-def relu_forward(x):
+def relu_forward(x, out=None, cache_mode='full'):
     """
     Computes the forward pass for a layer of rectified linear units (ReLUs).
 
     Input:
     - x: Inputs, of any shape
+    - out: Optional preallocated output array, of the shape and dtype of x.
+      With the 'mask' and 'packed' cache modes this can be x itself.
+    - cache_mode: What to keep for the backward pass: 'full' keeps x, 'mask'
+      a boolean mask (8x smaller for float64) and 'packed' a bit-packed mask
+      (64x smaller for float64).
 
     Returns a tuple of:
     - out: Output, of the same shape as x
-    - cache: x
+    - cache: x, or the stored mask
     """
-    out = None
     ###########################################################################
     # TODO: Implement the ReLU forward pass.                                  #
     ###########################################################################
-    out = np.copy(x)
-    out[out < 1e-9] = 0
+    drop = x < 1e-9
+    if cache_mode == 'full':
+        if out is x:
+            raise ValueError('relu_forward cannot work in place when caching x')
+        cache = x
+    else:
+        cache = store_mask(~drop, cache_mode)
+    if out is None:
+        out = np.copy(x)
+    elif out is not x:
+        np.copyto(out, x)
+    out[drop] = 0
     ###########################################################################
     #                             END OF YOUR CODE                            #
     ###########################################################################
-    cache = x
     return out, cache
 
 
-def relu_backward(dout, cache):
+def relu_backward(dout, cache, out=None):
     """
     Computes the backward pass for a layer of rectified linear units (ReLUs).
 
     Input:
     - dout: Upstream derivatives, of any shape
-    - cache: Input x, of same shape as dout
+    - cache: Input x, of same shape as dout, or the stored mask
+    - out: Optional preallocated array for dx, of the shape and dtype of dout
 
     Returns:
     - dx: Gradient with respect to x
     """
-    dx, x = None, cache
+    dx = None
     ###########################################################################
     # TODO: Implement the ReLU backward pass.                                 #
     ###########################################################################
-    mask = np.ones_like(x)
-    mask[x < 1e-9] = 0
-    dx = dout * mask
+    if isinstance(cache, tuple):
+        mask = load_mask(cache)
+    else:
+        # a boolean mask is enough, no need for a float copy of x
+        mask = ~(cache < 1e-9)
+    dx = np.multiply(dout, mask, out=out)
     ###########################################################################
     #                             END OF YOUR CODE                            #
     ###########################################################################
     return dx
 
 
+def batchnorm_normalize(x, eps=1e-5, out=None, gamma=None, beta=None, y=None,
+                        block_elems=1 << 18):
+    """
+    Normalize each feature of x with its mean and (uncorrected) variance.
+    Features are along the second axis; for data of shape (N, D) the
+    statistics are taken over the rows, for data of shape (N, C, H * W) over
+    the rows and the spatial positions, without any transposition.
+
+    The statistics are computed over contiguous tiles of rows: each tile is
+    read for its mean, centered into the output and summed up in squares
+    (three passes over the tile, but while it is in cache), and the moments
+    of the tiles are merged into running float64 ones with the parallel
+    update of Chan et al., which is numerically stable. The centered tile is
+    kept in the dtype of x, but its sums of squares are accumulated in
+    float64 as well.
+
+    When the whole batch fits in one tile (N * D * S <= block_elems) the
+    centered tile is then normalized, scaled and shifted in place, so x is
+    read from memory once. Otherwise the statistics are only known after the
+    first sweep, and a second sweep re-centers, normalizes, scales and shifts
+    every tile; this is not a single pass, but still avoids the separate
+    full-size temporaries of np.mean, np.var and the elementwise steps.
+
+    Inputs:
+    - x: Data of shape (N, D) or (N, D, S)
+    - eps: Constant added to the variance
+    - out: Optional output array for the normalized data; can be x itself
+    - gamma, beta: Optional scale and shift parameters of shape (D,); if given
+      gamma * x_norm + beta is computed in the same sweep
+    - y: Optional output array for gamma * x_norm + beta
+    - block_elems: Approximate number of elements in a tile
+
+    Returns a tuple of:
+    - x_norm: Normalized data of the shape and dtype of x
+    - y: gamma * x_norm + beta, or None if gamma is not given
+    - mean: Per-feature mean, float64 array of shape (D,)
+    - var: Per-feature variance, float64 array of shape (D,)
+    - std_inv: 1 / sqrt(var + eps), float64 array of shape (D,)
+    """
+    N, D = x.shape[:2]
+    if out is None:
+        out = np.empty_like(x)
+    if gamma is not None and y is None:
+        y = np.empty(x.shape, dtype=np.result_type(gamma, x))
+    row_size = int(np.prod(x.shape[1:]))
+    rows = max(1, block_elems // max(row_size, 1))
+    # reduce over every axis but the feature axis; per-feature arrays are
+    # reshaped to broadcast against a tile
+    axes = (0,) + tuple(range(2, x.ndim))
+    bshape = (D,) + (1,) * (x.ndim - 2)
+    idx = 'abcd'[:x.ndim]
+    sum_squares = '%s,%s->%s' % (idx, idx, idx[1])
+    # the centered tiles go to out, unless it is x itself
+    scratch = None
+    if np.may_share_memory(out, x):
+        scratch = np.empty((min(rows, N),) + x.shape[1:], dtype=x.dtype)
+
+    count = 0
+    mean = np.zeros(D, dtype=np.float64)
+    m2 = np.zeros(D, dtype=np.float64)
+    for r0 in range(0, N, rows):
+        tile = x[r0:r0 + rows]
+        n_tile = tile.size // D
+        m_tile = tile.mean(axis=axes, dtype=np.float64)
+        d = out[r0:r0 + rows] if scratch is None else scratch[:tile.shape[0]]
+        np.subtract(tile, m_tile.astype(x.dtype).reshape(bshape), out=d)
+        # accumulate the squares in float64, einsum does not sum pairwise
+        m2_tile = np.einsum(sum_squares, d, d, dtype=np.float64)
+        # merge the moments of the tile into the running ones
+        total = count + n_tile
+        delta = m_tile - mean
+        mean += delta * (n_tile / total)
+        m2 += m2_tile + delta * delta * (count * n_tile / total)
+        count = total
+    var = m2 / count
+    std_inv = 1 / np.sqrt(var + eps)
+
+    mean_x = mean.astype(x.dtype).reshape(bshape)
+    std_inv_x = std_inv.astype(x.dtype).reshape(bshape)
+    if N <= rows:
+        # a single tile: it was centered with the batch mean already, so it
+        # is only scaled (and shifted) while still in cache
+        np.multiply(d, std_inv_x, out=out)
+        if gamma is not None:
+            np.multiply(gamma.reshape(bshape), out, out=y)
+            y += beta.reshape(bshape)
+        return out, y, mean, var, std_inv
+
+    for r0 in range(0, N, rows):
+        r1 = min(r0 + rows, N)
+        np.subtract(x[r0:r1], mean_x, out=out[r0:r1])
+        out[r0:r1] *= std_inv_x
+        if gamma is not None:
+            np.multiply(gamma.reshape(bshape), out[r0:r1], out=y[r0:r1])
+            y[r0:r1] += beta.reshape(bshape)
+    return out, y, mean, var, std_inv
+
+
+def batchnorm_running_update(running_mean, running_var, mean, var, momentum,
+                             dtype):
+    """
+    Exponentially decaying running averages of the batch statistics, see
+    batchnorm_forward. The float64 batch statistics of batchnorm_normalize
+    are folded into averages of the given dtype (or of the dtype of the
+    running averages, if wider).
+
+    Returns a tuple of:
+    - running_mean, running_var: Updated arrays of shape (D,)
+    """
+    dtype = np.result_type(dtype, running_mean)
+    running_mean = momentum*running_mean+(1-momentum)*mean
+    running_var = momentum*running_var+(1-momentum)*var
+    return (running_mean.astype(dtype, copy=False),
+            running_var.astype(dtype, copy=False))
+
+
 def batchnorm_forward(x, gamma, beta, bn_param):
     """
     Forward pass for batch normalization.
@@ -178,22 +413,21 @@ def batchnorm_forward(x, gamma, beta, bn_param):
         # variance, storing your result in the running_mean and running_var   #
         # variables.                                                          #
         #######################################################################
-        # get the forwards pass done
-        batch_mean = np.mean(x, axis=0, keepdims=True)
-        batch_var = np.var(x, axis=0, keepdims=True)
-        x_center = x-batch_mean
-        x_var = batch_var+eps
-        x_std = np.sqrt(x_var)
-        x_std_inv = 1/x_std
-        x_normalized = x_center * x_std_inv
-        out = gamma[np.newaxis, :]*x_normalized + beta[np.newaxis, :]
+        # get the forwards pass done, statistics and output in one sweep
+        x_normalized, out, batch_mean, batch_var, x_std_inv = \
+            batchnorm_normalize(x, eps, gamma=gamma, beta=beta)
 
         # store running averages for testing
-        running_mean = momentum*running_mean+(1-momentum)*batch_mean.squeeze()
-        running_var = momentum*running_var+(1-momentum)*batch_var.squeeze()
-
-        # only store needed parameters for backward pass
-        cache = x_normalized, x_var, x_std_inv, x_center, gamma,
+        running_mean, running_var = batchnorm_running_update(
+            running_mean, running_var, batch_mean, batch_var, momentum,
+            x.dtype)
+
+        # only store needed parameters for backward pass; x_center is
+        # recomputed by batchnorm_backward, batchnorm_backward_alt does not
+        # need it
+        x_var = (batch_var + eps).astype(x.dtype)[np.newaxis, :]
+        x_std_inv = x_std_inv.astype(x.dtype)[np.newaxis, :]
+        cache = x_normalized, x_var, x_std_inv, None, gamma,
         #######################################################################
         #                           END OF YOUR CODE                          #
         #######################################################################
@@ -244,6 +478,8 @@ def batchnorm_backward(dout, cache):
     ###########################################################################
     # the cached values maintain the dimensions (no squeezing)
     x_normalized, x_var, x_std_inv, x_center, gamma = cache
+    if x_center is None:
+        x_center = x_normalized / x_std_inv
     # derive the computation graph (very good exercise!!!)
     # pay attention to the dimension
     dgamma = np.sum(dout*x_normalized, axis=0)
@@ -313,7 +549,47 @@ def batchnorm_backward_alt(dout, cache):
     return dx, dgamma, dbeta
 
 
-def dropout_forward(x, dropout_param):
+def batchnorm_scale_shift(gamma, beta, bn_param):
+    """
+    Per-feature scale and shift such that test-mode batchnorm_forward computes
+    x * scale + shift.
+
+    Inputs:
+    - gamma, beta, bn_param: As for batchnorm_forward
+
+    Returns a tuple of:
+    - scale: Array of shape (D,)
+    - shift: Array of shape (D,)
+    """
+    eps = bn_param.get('eps', 1e-5)
+    D = gamma.shape[0]
+    running_mean = bn_param.get('running_mean', np.zeros(D, dtype=gamma.dtype))
+    running_var = bn_param.get('running_var', np.zeros(D, dtype=gamma.dtype))
+    scale = gamma / np.sqrt(running_var + eps)
+    shift = beta - running_mean * scale
+    return scale, shift
+
+
+def batchnorm_fold(w, b, gamma, beta, bn_param):
+    """
+    Fold a test-mode batch normalization into the affine layer before it, so
+    that affine_forward(x, w_folded, b_folded) computes
+    batchnorm_forward(affine_forward(x, w, b)) with the running statistics.
+
+    Inputs:
+    - w, b: Weights of shape (D, M) and biases of shape (M,) of the affine layer
+    - gamma, beta, bn_param: Parameters of the batchnorm layer, as for
+      batchnorm_forward
+
+    Returns a tuple of:
+    - w_folded: Array of shape (D, M)
+    - b_folded: Array of shape (M,)
+    """
+    scale, shift = batchnorm_scale_shift(gamma, beta, bn_param)
+    return w * scale[np.newaxis, :], b * scale + shift
+
+
+def dropout_forward(x, dropout_param, out=None):
     """
     Performs the forward pass for (inverted) dropout.
 
@@ -326,27 +602,40 @@ def dropout_forward(x, dropout_param):
       - seed: Seed for the random number generator. Passing seed makes this
         function deterministic, which is needed for gradient checking but not
         in real networks.
+      - cache_mode: Optional; 'full' (default) caches the float mask divided
+        by p, 'mask' a boolean mask and 'packed' a bit-packed mask. The two
+        latter draw the mask with random_keep_mask, which is faster.
+    - out: Optional preallocated output array, of the shape and dtype of x;
+      only used in training mode. It can be x itself.
 
     Outputs:
     - out: Array of the same shape as x.
     - cache: tuple (dropout_param, mask). In training mode, mask is the dropout
-      mask that was used to multiply the input; in test mode, mask is None.
+      mask that was used to multiply the input, or the stored boolean mask;
+      in test mode, mask is None.
     """
     p, mode = dropout_param['p'], dropout_param['mode']
+    cache_mode = dropout_param.get('cache_mode', 'full')
     if 'seed' in dropout_param:
         np.random.seed(dropout_param['seed'])
 
     mask = None
-    out = None
 
     if mode == 'train':
         #######################################################################
         # TODO: Implement training phase forward pass for inverted dropout.   #
         # Store the dropout mask in the mask variable.                        #
         #######################################################################
-        # star here unpacks the sequence/collection into positional arguments
-        mask = (np.random.rand(*x.shape) > p)/p
-        out = x*mask
+        if cache_mode == 'full':
+            # star here unpacks the sequence/collection into positional
+            # arguments
+            mask = (np.random.rand(*x.shape) > p)/p
+            out = np.multiply(x, mask, out=out, casting='unsafe')
+        else:
+            keep = random_keep_mask(x.shape, p)
+            out = np.multiply(x, keep, out=out)
+            out *= 1.0 / p
+            mask = store_mask(keep, cache_mode)
         #######################################################################
         #                           END OF YOUR CODE                          #
         #######################################################################
@@ -365,13 +654,15 @@ def dropout_forward(x, dropout_param):
     return out, cache
 
 
-def dropout_backward(dout, cache):
+def dropout_backward(dout, cache, out=None):
     """
     Perform the backward pass for (inverted) dropout.
 
     Inputs:
     - dout: Upstream derivatives, of any shape
     - cache: (dropout_param, mask) from dropout_forward.
+    - out: Optional preallocated array for dx, of the shape and dtype of dout;
+      only used in training mode.
     """
     dropout_param, mask = cache
     mode = dropout_param['mode']
@@ -381,7 +672,11 @@ def dropout_backward(dout, cache):
         #######################################################################
         # TODO: Implement training phase backward pass for inverted dropout   #
         #######################################################################
-        dx = dout*mask
+        if isinstance(mask, tuple):
+            dx = np.multiply(dout, load_mask(mask), out=out)
+            dx *= 1.0 / dropout_param['p']
+        else:
+            dx = np.multiply(dout, mask, out=out, casting='unsafe')
         #######################################################################
         #                          END OF YOUR CODE                           #
         #######################################################################
@@ -550,6 +845,12 @@ def spatial_batchnorm_forward(x, gamma, beta, bn_param):
     """
     Computes the forward pass for spatial batch normalization.
 
+    The statistics of every channel are taken over axes (0, 2, 3) directly in
+    the NCHW layout, see batchnorm_normalize, so unlike going through
+    batchnorm_forward no transposed copy of x (or of dout in the backward
+    pass) is made. The cache only holds the normalized input and the
+    per-channel inverse standard deviation.
+
     Inputs:
     - x: Input data of shape (N, C, H, W)
     - gamma: Scale parameter, of shape (C,)
@@ -561,8 +862,8 @@ def spatial_batchnorm_forward(x, gamma, beta, bn_param):
         old information is discarded completely at every time step, while
         momentum=1 means that new information is never incorporated. The
         default of momentum=0.9 should work well in most situations.
-      - running_mean: Array of shape (D,) giving running mean of features
-      - running_var Array of shape (D,) giving running variance of features
+      - running_mean: Array of shape (C,) giving running mean of features
+      - running_var Array of shape (C,) giving running variance of features
 
     Returns a tuple of:
     - out: Output data, of shape (N, C, H, W)
@@ -577,10 +878,33 @@ def spatial_batchnorm_forward(x, gamma, beta, bn_param):
     # version of batch normalization defined above. Your implementation should#
     # be very short; ours is less than five lines.                            #
     ###########################################################################
+    mode = bn_param['mode']
+    eps = bn_param.get('eps', 1e-5)
+    momentum = bn_param.get('momentum', 0.9)
+
     N, C, H, W = x.shape
-    x_transform = np.swapaxes(x, 1, 3).reshape((-1, C))
-    out, cache = batchnorm_forward(x_transform, gamma, beta, bn_param)
-    out = np.swapaxes(out.reshape(N, W, H, C), 1, 3)
+    running_mean = bn_param.get('running_mean', np.zeros(C, dtype=x.dtype))
+    running_var = bn_param.get('running_var', np.zeros(C, dtype=x.dtype))
+
+    # merging the spatial axes is free for a contiguous x
+    x_flat = x.reshape((N, C, H * W))
+    if mode == 'train':
+        x_norm, out, mean, var, std_inv = \
+            batchnorm_normalize(x_flat, eps, gamma=gamma, beta=beta)
+        running_mean, running_var = batchnorm_running_update(
+            running_mean, running_var, mean, var, momentum, x.dtype)
+        cache = x_norm, std_inv.astype(x.dtype), gamma
+    elif mode == 'test':
+        scale, shift = batchnorm_scale_shift(
+            gamma, beta, {'eps': eps, 'running_mean': running_mean,
+                          'running_var': running_var})
+        out = x_flat * scale[:, np.newaxis] + shift[:, np.newaxis]
+    else:
+        raise ValueError('Invalid forward batchnorm mode "%s"' % mode)
+    out = out.reshape(x.shape)
+
+    bn_param['running_mean'] = running_mean
+    bn_param['running_var'] = running_var
     ###########################################################################
     #                             END OF YOUR CODE                            #
     ###########################################################################
@@ -610,10 +934,20 @@ def spatial_batchnorm_backward(dout, cache):
     # version of batch normalization defined above. Your implementation should#
     # be very short; ours is less than five lines.                            #
     ###########################################################################
+    # same as batchnorm_backward_alt with sums over axes (0, 2, 3), using
+    # sum(dout * gamma) = gamma * dbeta and sum(dout * gamma * x_norm) =
+    # gamma * dgamma
     N, C, H, W = dout.shape
-    dout_transform = np.swapaxes(dout, 1, 3).reshape((-1, C))
-    dx, dgamma, dbeta = batchnorm_backward(dout_transform, cache)
-    dx = np.swapaxes(dx.reshape(N, W, H, C), 1, 3)
+    x_norm, x_std_inv, gamma = cache
+    dout = dout.reshape((N, C, H * W))
+    dbeta = np.einsum('ncs->c', dout)
+    dgamma = np.einsum('ncs,ncs->c', dout, x_norm)
+    m = N * H * W
+    dx = x_norm * (-dgamma / m)[:, np.newaxis]
+    dx += dout
+    dx -= (dbeta / m)[:, np.newaxis]
+    dx *= (gamma * x_std_inv)[:, np.newaxis]
+    dx = dx.reshape((N, C, H, W))
     ###########################################################################
     #                             END OF YOUR CODE                            #
     ###########################################################################
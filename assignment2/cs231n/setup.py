@@ -1,8 +1,33 @@
 from distutils.core import setup
+from distutils.command.build_ext import build_ext
 from distutils.extension import Extension
 from Cython.Build import cythonize
+import sys
 import numpy
 
+
+class build_ext_openmp(build_ext):
+    """
+    The col2im scatters run on several threads with OpenMP. The flag that
+    enables it depends on the compiler; Apple's compiler does not support
+    OpenMP at all, and there they run serially.
+    """
+
+    def build_extensions(self):
+        compiler_type = self.compiler.compiler_type
+        if compiler_type == 'msvc':
+            compile_args, link_args = ['/openmp'], []
+        elif compiler_type in ('unix', 'mingw32', 'cygwin') \
+                and sys.platform != 'darwin':
+            compile_args, link_args = ['-fopenmp'], ['-fopenmp']
+        else:
+            compile_args, link_args = [], []
+        for ext in self.extensions:
+            ext.extra_compile_args = compile_args
+            ext.extra_link_args = link_args
+        build_ext.build_extensions(self)
+
+
 extensions = [
   Extension('im2col_cython', ['im2col_cython.pyx'],
             include_dirs = [numpy.get_include()]
@@ -10,5 +35,6 @@ extensions = [
 ]
 
 setup(
+    cmdclass = {'build_ext': build_ext_openmp},
     ext_modules = cythonize(extensions),
 )
@@ -0,0 +1,232 @@
+from __future__ import print_function, division
+from builtins import range
+from builtins import object
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from cs231n.data_utils import save_array_bundle, load_array_bundle
+
+
+def file_checksum(filename, block_size=1 << 20):
+    """ sha1 hex digest of a file, read in blocks """
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def write_sharded_dataset(directory, arrays, shard_size=10000, info=None):
+    """
+    Write a dataset as fixed-size shards plus a JSON index.
+
+    Every shard is an array bundle (see save_array_bundle) holding shard_size
+    consecutive examples of every array, except the last shard which may be
+    shorter. Because all shards have the same size, example i lives in shard
+    i // shard_size at position i % shard_size. The index, index.json, lists
+    the shards with their sha1 checksums and the dtype and per-example shape
+    of every array.
+
+    The arrays are only read one shard at a time, so memmaps or other
+    array-likes larger than memory can be converted.
+
+    Inputs:
+    - directory: Directory to write to; it is created if needed.
+    - arrays: Dictionary mapping names to arrays that share their first
+      dimension, e.g. {'X': X_train, 'y': y_train}.
+    - shard_size: Number of examples per shard.
+    - info: Optional JSON-serializable dictionary stored in the index.
+    """
+    names = sorted(arrays)
+    num_samples = arrays[names[0]].shape[0]
+    for name in names:
+        if arrays[name].shape[0] != num_samples:
+            raise ValueError('Array "%s" has %d examples, expected %d'
+                             % (name, arrays[name].shape[0], num_samples))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    shards = []
+    for start in range(0, num_samples, shard_size):
+        end = min(start + shard_size, num_samples)
+        filename = 'shard_%05d.bin' % len(shards)
+        path = os.path.join(directory, filename)
+        chunk = {name: np.asarray(arrays[name][start:end]) for name in names}
+        save_array_bundle(path, chunk)
+        shards.append({'file': filename, 'start': start, 'count': end - start,
+                       'sha1': file_checksum(path)})
+
+    index = {
+      'num_samples': num_samples,
+      'shard_size': shard_size,
+      'shards': shards,
+      'arrays': {name: {'dtype': np.dtype(arrays[name].dtype).str,
+                        'shape': list(arrays[name].shape[1:])}
+                 for name in names},
+      'info': info or {},
+    }
+    with open(os.path.join(directory, 'index.json'), 'w') as f:
+        json.dump(index, f, indent=1)
+
+
+class ShardedDataset(object):
+    """
+    Random-access reader for a dataset written by write_sharded_dataset.
+
+    Shards are memory-mapped on first use only, so opening a dataset is cheap
+    whatever its size, and gathering a minibatch touches only the pages of the
+    examples it contains. Use array(name) to get an array-like that can stand
+    in for X_train / y_train in the data dictionary of a Solver, and
+    sampler(batch_size) to draw minibatches with good locality.
+    """
+
+    def __init__(self, directory, verify=False):
+        """
+        Open a sharded dataset.
+
+        Inputs:
+        - directory: Directory containing index.json and the shards.
+        - verify: If True, check the checksum of every shard the first time
+          it is opened (this reads the whole shard).
+        """
+        self.directory = directory
+        self.verify_checksums = verify
+        with open(os.path.join(directory, 'index.json'), 'r') as f:
+            index = json.load(f)
+        self.num_samples = index['num_samples']
+        self.shard_size = index['shard_size']
+        self.shards = index['shards']
+        self.array_info = index['arrays']
+        self.info = index['info']
+        self._mapped = [None] * len(self.shards)
+
+
+    def __len__(self):
+        return self.num_samples
+
+
+    def shard(self, s):
+        """
+        Return the dictionary of memmaps of shard s, opening it if needed.
+        """
+        if self._mapped[s] is None:
+            entry = self.shards[s]
+            path = os.path.join(self.directory, entry['file'])
+            if self.verify_checksums and file_checksum(path) != entry['sha1']:
+                raise IOError('Checksum mismatch for shard "%s"' % path)
+            self._mapped[s], _ = load_array_bundle(path)
+        return self._mapped[s]
+
+
+    def verify(self):
+        """
+        Check the checksums of all shards. Returns the list of the files that
+        do not match their index entry.
+        """
+        bad = []
+        for entry in self.shards:
+            path = os.path.join(self.directory, entry['file'])
+            if not os.path.isfile(path) or file_checksum(path) != entry['sha1']:
+                bad.append(entry['file'])
+        return bad
+
+
+    def gather(self, name, idx, out=None):
+        """
+        Gather examples of one array.
+
+        Inputs:
+        - name: Name of the array.
+        - idx: Integer array of example indices, in any order.
+        - out: Optional output array of shape (len(idx), ...).
+
+        Returns:
+        - out: Array holding the examples in the order given by idx.
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        if idx.size and (idx.min() < 0 or idx.max() >= self.num_samples):
+            raise IndexError('index out of range for dataset of size %d'
+                             % self.num_samples)
+        meta = self.array_info[name]
+        if out is None:
+            out = np.empty((idx.shape[0],) + tuple(meta['shape']),
+                           dtype=meta['dtype'])
+        shard_ids = idx // self.shard_size
+        for s in np.unique(shard_ids):
+            mask = shard_ids == s
+            local = idx[mask] - s * self.shard_size
+            out[mask] = self.shard(s)[name][local]
+        return out
+
+
+    def array(self, name):
+        """
+        Return a ShardedArray giving ndarray-style access to one array.
+        """
+        return ShardedArray(self, name)
+
+
+    def sampler(self, batch_size, seed=None):
+        """
+        Generate minibatch index arrays forever, one epoch after another.
+        Each epoch visits the shards in random order and the examples of a
+        shard in random order, so consecutive minibatches come from the same
+        shard and only a few shards are hot at any time. Batches may span the
+        boundary between two shards; the incomplete last batch of an epoch is
+        dropped.
+
+        This can be passed as the sampler of a DataLoader.
+        """
+        if batch_size < 1 or batch_size > self.num_samples:
+            raise ValueError('batch_size must be between 1 and %d, got %d'
+                             % (self.num_samples, batch_size))
+        return self._sample(batch_size, seed)
+
+
+    def _sample(self, batch_size, seed):
+        rng = np.random.RandomState(seed)
+        while True:
+            order = [self.shards[s]['start'] + rng.permutation(
+                         self.shards[s]['count'])
+                     for s in rng.permutation(len(self.shards))]
+            order = np.concatenate(order)
+            for start in range(0, self.num_samples - batch_size + 1,
+                               batch_size):
+                yield order[start:start + batch_size]
+
+
+class ShardedArray(object):
+    """
+    Array-like view of one array of a ShardedDataset. Supports shape, len()
+    and indexing along the first axis with an integer, a slice or an integer
+    array, which is what Solver and DataLoader need.
+    """
+
+    def __init__(self, dataset, name):
+        self.dataset = dataset
+        self.name = name
+        meta = dataset.array_info[name]
+        self.dtype = np.dtype(meta['dtype'])
+        self.shape = (dataset.num_samples,) + tuple(meta['shape'])
+        self.ndim = len(self.shape)
+
+
+    def __len__(self):
+        return self.shape[0]
+
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            idx = np.arange(*idx.indices(self.shape[0]))
+        elif np.isscalar(idx):
+            idx = int(idx)
+            if idx < 0:
+                idx += self.shape[0]
+            return self.dataset.gather(self.name, [idx])[0]
+        return self.dataset.gather(self.name, idx)
@@ -9,6 +9,49 @@ import pickle as pickle
 import numpy as np
 
 from cs231n import optim
+from cs231n.data_loader import DataLoader
+from cs231n.data_utils import (ARRAY_BUNDLE_MAGIC, load_array_bundle,
+                               load_model_bundle, load_pickle,
+                               save_model_bundle)
+
+
+def _split_arrays(config):
+    """
+    Split a dictionary into the entries that can be stored as JSON, with
+    numpy scalars converted to Python numbers, and the array-valued ones.
+    """
+    values, arrays = {}, {}
+    for k, v in config.items():
+        if isinstance(v, np.ndarray):
+            arrays[k] = v
+        elif isinstance(v, np.generic):
+            values[k] = v.item()
+        else:
+            values[k] = v
+    return values, arrays
+
+
+def load_checkpoint(filename):
+    """
+    Load a checkpoint written by a Solver in either checkpoint_format.
+
+    Returns the checkpoint dictionary, with the model under 'model'. For
+    bundles the model weights are memory-mapped (see load_model_bundle) and
+    array-valued optim_config entries are read back into optim_config.
+    """
+    with open(filename, 'rb') as f:
+        if f.read(len(ARRAY_BUNDLE_MAGIC)) != ARRAY_BUNDLE_MAGIC:
+            f.seek(0)
+            return load_pickle(f)
+    arrays, checkpoint = load_array_bundle(filename)
+    del checkpoint['model_class']
+    checkpoint['model'] = load_model_bundle(filename)
+    checkpoint['update_rule'] = getattr(optim, checkpoint['update_rule'])
+    for name, arr in arrays.items():
+        if name.startswith('optim_config/'):
+            checkpoint['optim_config'][name[len('optim_config/'):]] = \
+                np.array(arr)
+    return checkpoint
 
 
 class Solver(object):
@@ -92,6 +135,9 @@ class Solver(object):
           'X_val': Array, shape (N_val, d_1, ..., d_k) of validation images
           'y_train': Array, shape (N_train,) of labels for training images
           'y_val': Array, shape (N_val,) of labels for validation images
+          Alternatively a DataLoader built on such a dictionary; minibatches
+          are then prepared on background threads, and the batch_size of the
+          loader is used.
 
         Optional arguments:
         - update_rule: A string giving the name of an update rule in optim.py.
@@ -115,8 +161,16 @@ class Solver(object):
           accuracy; default is None, which uses the entire validation set.
         - checkpoint_name: If not None, then save model checkpoints here every
           epoch.
+        - checkpoint_format: 'pickle' (default) to pickle the whole checkpoint
+          dictionary, or 'bundle' to write it with save_model_bundle so that
+          the weights can be memory-mapped by ModelRegistry. Either can be
+          read back with load_checkpoint.
         """
         self.model = model
+        self.loader = None
+        if isinstance(data, DataLoader):
+            self.loader = data
+            data = data.data
         self.X_train = data['X_train']
         self.y_train = data['y_train']
         self.X_val = data['X_val']
@@ -132,14 +186,21 @@ class Solver(object):
         self.num_val_samples = kwargs.pop('num_val_samples', None)
 
         self.checkpoint_name = kwargs.pop('checkpoint_name', None)
+        self.checkpoint_format = kwargs.pop('checkpoint_format', 'pickle')
         self.print_every = kwargs.pop('print_every', 10)
         self.verbose = kwargs.pop('verbose', True)
+        if self.loader is not None:
+            self.batch_size = self.loader.batch_size
 
         # Throw an error if there are extra keyword arguments
         if len(kwargs) > 0:
             extra = ', '.join('"%s"' % k for k in list(kwargs.keys()))
             raise ValueError('Unrecognized arguments %s' % extra)
 
+        if self.checkpoint_format not in ('pickle', 'bundle'):
+            raise ValueError('Invalid checkpoint_format "%s"'
+                             % self.checkpoint_format)
+
         # Make sure the update rule exists, then replace the string
         # name with the actual function
         if not hasattr(optim, self.update_rule):
@@ -176,10 +237,13 @@ class Solver(object):
         be called manually.
         """
         # Make a minibatch of training data
-        num_train = self.X_train.shape[0]
-        batch_mask = np.random.choice(num_train, self.batch_size)
-        X_batch = self.X_train[batch_mask]
-        y_batch = self.y_train[batch_mask]
+        if self.loader is not None:
+            X_batch, y_batch = self.loader.next()
+        else:
+            num_train = self.X_train.shape[0]
+            batch_mask = np.random.choice(num_train, self.batch_size)
+            X_batch = self.X_train[batch_mask]
+            y_batch = self.y_train[batch_mask]
 
         # Compute loss and gradient
         loss, grads = self.model.loss(X_batch, y_batch)
@@ -209,6 +273,26 @@ class Solver(object):
           'train_acc_history': self.train_acc_history,
           'val_acc_history': self.val_acc_history,
         }
+        if self.checkpoint_format == 'bundle':
+            filename = '%s_epoch_%d.bin' % (self.checkpoint_name, self.epoch)
+            if self.verbose:
+                print('Saving checkpoint to "%s"' % filename)
+            # JSON header: numpy scalars become Python numbers and arrays in
+            # optim_config, e.g. a restored Adam state, go into the bundle
+            del checkpoint['model']
+            checkpoint, _ = _split_arrays(checkpoint)
+            optim_config, optim_arrays = _split_arrays(self.optim_config)
+            checkpoint['optim_config'] = optim_config
+            checkpoint['update_rule'] = self.update_rule.__name__
+            checkpoint['loss_history'] = [float(l) for l in self.loss_history]
+            checkpoint['train_acc_history'] = [
+                float(a) for a in self.train_acc_history]
+            checkpoint['val_acc_history'] = [
+                float(a) for a in self.val_acc_history]
+            save_model_bundle(filename, self.model, info=checkpoint,
+                              arrays={'optim_config/%s' % k: v
+                                      for k, v in optim_arrays.items()})
+            return
         filename = '%s_epoch_%d.pkl' % (self.checkpoint_name, self.epoch)
         if self.verbose:
             print('Saving checkpoint to "%s"' % filename)
@@ -265,6 +349,20 @@ class Solver(object):
         iterations_per_epoch = max(num_train // self.batch_size, 1)
         num_iterations = self.num_epochs * iterations_per_epoch
 
+        try:
+            self._train(num_iterations, iterations_per_epoch)
+        finally:
+            if self.loader is not None:
+                self.loader.close()
+
+        # At the end of training swap the best params into the model
+        self.model.params = self.best_params
+
+
+    def _train(self, num_iterations, iterations_per_epoch):
+        """
+        Run the optimization loop of train(). Don't call this manually.
+        """
         for t in range(num_iterations):
             self._step()
 
@@ -304,6 +402,3 @@ class Solver(object):
                     self.best_params = {}
                     for k, v in self.model.params.items():
                         self.best_params[k] = v.copy()
-
-        # At the end of training swap the best params into the model
-        self.model.params = self.best_params
@@ -0,0 +1,58 @@
+import numpy as np
+
+from cs231n.layers import batchnorm_normalize
+
+
+def test_float32_statistics_match_float64_reference():
+    rng = np.random.RandomState(0)
+    x = (rng.randn(1 << 20, 2) * 3 + 100).astype(np.float32)
+    x64 = x.astype(np.float64)
+    # a single large tile, and many small ones that are merged
+    for block_elems in [x.size, 1 << 12]:
+        x_norm, _, mean, var, _ = batchnorm_normalize(
+            x, block_elems=block_elems)
+        assert mean.dtype == var.dtype == np.float64
+        assert np.allclose(mean, x64.mean(axis=0), rtol=1e-9, atol=0)
+        assert np.allclose(var, x64.var(axis=0), rtol=1e-7, atol=0)
+        ref = (x64 - x64.mean(axis=0)) / np.sqrt(x64.var(axis=0) + 1e-5)
+        assert np.allclose(x_norm, ref, rtol=0, atol=1e-4)
+
+
+def test_spatial_statistics_match_float64_reference():
+    rng = np.random.RandomState(1)
+    x = (rng.randn(1 << 14, 4, 64) * 3 + 100).astype(np.float32)
+    x64 = x.astype(np.float64)
+    _, _, mean, var, _ = batchnorm_normalize(x, block_elems=x.size)
+    assert np.allclose(mean, x64.mean(axis=(0, 2)), rtol=1e-9, atol=0)
+    assert np.allclose(var, x64.var(axis=(0, 2)), rtol=1e-7, atol=0)
+
+
+def test_single_tile_matches_tiled_sweep():
+    rng = np.random.RandomState(2)
+    for shape in [(50, 6), (20, 3, 7)]:
+        x = rng.randn(*shape) * 2 + 5
+        gamma, beta = rng.randn(shape[1]), rng.randn(shape[1])
+        axes = (0,) + tuple(range(2, x.ndim))
+        bshape = (shape[1],) + (1,) * (x.ndim - 2)
+        ref = (x - x.mean(axis=axes).reshape(bshape)) / np.sqrt(
+            x.var(axis=axes).reshape(bshape) + 1e-5)
+        # one tile, several tiles with a partial last one, and one row each
+        for block_elems in [x.size, 3 * x.size // shape[0], 1]:
+            x_norm, y, mean, var, std_inv = batchnorm_normalize(
+                x, gamma=gamma, beta=beta, block_elems=block_elems)
+            assert np.allclose(x_norm, ref)
+            assert np.allclose(y, gamma.reshape(bshape) * ref
+                               + beta.reshape(bshape))
+            assert np.allclose(std_inv, 1 / np.sqrt(var + 1e-5))
+
+
+def test_normalize_in_place():
+    rng = np.random.RandomState(3)
+    x = rng.randn(40, 5) * 3 - 1
+    for block_elems in [x.size, 10]:
+        expected = batchnorm_normalize(x, block_elems=block_elems)[0]
+        x_inplace = x.copy()
+        x_norm = batchnorm_normalize(x_inplace, out=x_inplace,
+                                     block_elems=block_elems)[0]
+        assert x_norm is x_inplace
+        assert np.allclose(x_inplace, expected)
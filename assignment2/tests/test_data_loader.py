@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from cs231n.data_loader import DataLoader, random_crop, random_flip
+
+
+def make_data(N=20):
+    rng = np.random.RandomState(0)
+    return {'X_train': rng.randint(0, 256, size=(N, 3, 4, 5)).astype(np.uint8),
+            'y_train': rng.randint(10, size=N),
+            'X_val': np.zeros((2, 3, 4, 5)), 'y_val': np.zeros(2, dtype=int)}
+
+
+def test_batches_follow_sampler():
+    data = make_data()
+    order = [np.arange(5), np.arange(10, 15), np.array([3, 3, 0, 19, 7])]
+    loader = DataLoader(data, batch_size=5, sampler=iter(order),
+                        dtype=np.float32)
+    try:
+        for idx in order:
+            X, y = loader.next()
+            assert X.dtype == np.float32
+            assert np.array_equal(X, data['X_train'][idx])
+            assert np.array_equal(y, data['y_train'][idx])
+    finally:
+        loader.close()
+
+
+def test_uniform_sampling_is_seeded():
+    data = make_data()
+    batches = []
+    for _ in range(2):
+        loader = DataLoader(data, batch_size=4, seed=1, num_workers=1)
+        try:
+            batches.append([loader.next()[1].copy() for _ in range(3)])
+        finally:
+            loader.close()
+    for a, b in zip(*batches):
+        assert np.array_equal(a, b)
+
+
+def test_buffers_are_recycled():
+    loader = DataLoader(make_data(), batch_size=4, num_workers=1, prefetch=1)
+    try:
+        seen = set(id(loader.next()[0].base) for _ in range(10))
+    finally:
+        loader.close()
+    assert len(seen) <= loader.num_workers + loader.prefetch + 1
+
+
+def test_augment_only_changes_images():
+    data = make_data()
+    order = [np.arange(20)]
+    loader = DataLoader(data, batch_size=20, sampler=iter(order),
+                        augment=random_flip, seed=0)
+    try:
+        X, y = loader.next()
+    finally:
+        loader.close()
+    assert np.array_equal(y, data['y_train'])
+    flipped = data['X_train'][:, :, :, ::-1]
+    for i in range(20):
+        assert (np.array_equal(X[i], data['X_train'][i])
+                or np.array_equal(X[i], flipped[i]))
+
+
+def test_worker_errors_are_raised():
+    loader = DataLoader(make_data(), batch_size=5, sampler=iter([]))
+    with pytest.raises(StopIteration):
+        loader.next()
+    assert not loader._threads
+
+
+def test_random_crop():
+    X = np.random.RandomState(0).randn(6, 2, 5, 5)
+    X_crop = X.copy()
+    random_crop(X_crop, np.random.RandomState(0), padding=0)
+    assert np.array_equal(X_crop, X)
+    random_crop(X_crop, np.random.RandomState(0), padding=2)
+    assert X_crop.shape == X.shape
+    # every crop is a shifted copy of the image, padded with zeros
+    for i in range(6):
+        assert any(
+            np.array_equal(X_crop[i],
+                           np.pad(X[i], ((0, 0), (2, 2), (2, 2)),
+                                  mode='constant')[:, dy:dy + 5, dx:dx + 5])
+            for dy in range(5) for dx in range(5))
@@ -0,0 +1,55 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from cs231n.data_utils import save_array_bundle, load_array_bundle
+
+
+def test_bundle_round_trip(tmpdir):
+    filename = str(tmpdir.join('data.bin'))
+    arrays = {'X': np.arange(24, dtype=np.float32).reshape(2, 3, 4),
+              'y': np.array([3, 1], dtype=np.int64)}
+    save_array_bundle(filename, arrays, info={'split': 'train'})
+    loaded, info = load_array_bundle(filename)
+    assert info == {'split': 'train'}
+    for name in arrays:
+        assert np.array_equal(loaded[name], arrays[name])
+    assert os.listdir(str(tmpdir)) == ['data.bin']
+
+
+def test_failed_write_leaves_no_temporary_file(tmpdir):
+    filename = str(tmpdir.join('data.bin'))
+    # object arrays cannot be written in binary mode
+    with pytest.raises(Exception):
+        save_array_bundle(filename, {'X': np.array([object()])})
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_concurrent_writers(tmpdir):
+    filename = str(tmpdir.join('data.bin'))
+    arrays = [{'X': np.full(100000, i, dtype=np.float64)} for i in range(4)]
+    threads = [threading.Thread(target=save_array_bundle, args=(filename, a))
+               for a in arrays]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    loaded, _ = load_array_bundle(filename)
+    # the file is complete and comes from a single writer
+    assert np.all(loaded['X'] == loaded['X'][0])
+    assert os.listdir(str(tmpdir)) == ['data.bin']
+
+
+def test_bundle_gets_plain_open_permissions(tmpdir):
+    filename = str(tmpdir.join('data.bin'))
+    plain = str(tmpdir.join('plain.bin'))
+    umask = os.umask(0o027)
+    try:
+        save_array_bundle(filename, {'X': np.zeros(3)})
+        open(plain, 'w').close()
+    finally:
+        os.umask(umask)
+    assert os.stat(filename).st_mode == os.stat(plain).st_mode
+    assert sorted(os.listdir(str(tmpdir))) == ['data.bin', 'plain.bin']
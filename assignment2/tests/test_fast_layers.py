@@ -0,0 +1,234 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from cs231n import fast_layers
+from cs231n.fast_layers import (ConvAutoTuner, conv_cols_nbytes,
+                                conv_forward_fast, conv_backward_fast,
+                                max_pool_forward_fast, max_pool_backward_fast,
+                                max_pool_forward_strides,
+                                max_pool_backward_strides,
+                                plan_conv_recompute)
+
+
+LAYERS = [
+    ((100, 3, 32, 32), (32, 3, 7, 7), {'stride': 1, 'pad': 3}, np.float32),
+    ((100, 32, 16, 16), (64, 32, 3, 3), {'stride': 1, 'pad': 1}, np.float32),
+    ((100, 64, 8, 8), (128, 64, 3, 3), {'stride': 1, 'pad': 1}, np.float32),
+    ((100, 128, 8, 8), (128, 128, 3, 3), {'stride': 2, 'pad': 1}, np.float32),
+]
+
+
+def test_cols_nbytes():
+    assert conv_cols_nbytes(*LAYERS[0]) == 3 * 7 * 7 * 100 * 32 * 32 * 4
+    assert conv_cols_nbytes(*LAYERS[3]) == 128 * 3 * 3 * 100 * 4 * 4 * 4
+
+
+@pytest.mark.parametrize('budget', [0, 1 << 20, 10 << 20, 20 << 20,
+                                    40 << 20, 60 << 20, 1 << 40])
+def test_plan_respects_budget(budget):
+    sizes = [conv_cols_nbytes(*layer) for layer in LAYERS]
+    recompute = plan_conv_recompute(LAYERS, budget)
+    assert len(recompute) == len(LAYERS)
+    stored = sum(s for s, r in zip(sizes, recompute) if not r)
+    assert stored <= budget
+    # no recomputed layer would still have fit into what is left
+    for s, r in zip(sizes, recompute):
+        if r:
+            assert s > budget - stored
+
+
+def test_plan_mixed_choice():
+    sizes = [conv_cols_nbytes(*layer) for layer in LAYERS]
+    # room for all but the largest layer
+    budget = sum(sizes) - max(sizes)
+    recompute = plan_conv_recompute(LAYERS, budget)
+    assert recompute == [s == max(sizes) for s in sizes]
+    assert plan_conv_recompute(LAYERS, None) == [False] * len(LAYERS)
+    assert plan_conv_recompute(LAYERS, 0) == [True] * len(LAYERS)
+
+
+@pytest.mark.parametrize('method', ['strides', 'im2col'])
+@pytest.mark.parametrize('stride, pad', [(1, 1), (2, 1)])
+def test_recompute_matches_stored(method, stride, pad):
+    rng = np.random.RandomState(0)
+    x = rng.randn(3, 2, 9, 9)
+    w = rng.randn(4, 2, 3, 3)
+    b = rng.randn(4)
+    conv_param = {'stride': stride, 'pad': pad, 'method': method}
+    out, cache = conv_forward_fast(x, w, b, conv_param)
+    dout = rng.randn(*out.shape)
+    grads = conv_backward_fast(dout, cache)
+
+    conv_param = dict(conv_param, recompute=True)
+    out_r, cache_r = conv_forward_fast(x, w, b, conv_param)
+    assert cache_r[1][4] is None
+    assert np.array_equal(out, out_r)
+    for g, g_r in zip(grads, conv_backward_fast(dout, cache_r)):
+        assert np.allclose(g, g_r)
+
+
+def conv_inputs(seed=0):
+    rng = np.random.RandomState(seed)
+    return (rng.randn(2, 3, 8, 8), rng.randn(4, 3, 3, 3), rng.randn(4),
+            {'stride': 1, 'pad': 1})
+
+
+def test_tuner_without_file_stays_in_memory(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    x, w, b, conv_param = conv_inputs()
+    tuner = ConvAutoTuner(repeats=1)
+    method = tuner.choose(x, w, b, conv_param)
+    assert method in fast_layers._conv_methods
+    assert tuner.results[tuner.key(x, w, conv_param)]['method'] == method
+    assert os.listdir(str(tmpdir)) == []
+    # the module-level tuner only persists when asked to
+    assert (fast_layers.conv_tuner.filename
+            == (os.environ.get('CS231N_CONV_TUNING_FILE') or None))
+
+
+def test_tuner_results_are_shared_through_file(tmpdir):
+    filename = str(tmpdir.join('sub', 'tuning.json'))
+    x, w, b, conv_param = conv_inputs()
+    method = ConvAutoTuner(filename, repeats=1).choose(x, w, b, conv_param)
+    assert os.listdir(str(tmpdir.join('sub'))) == ['tuning.json']
+
+    tuner = ConvAutoTuner(filename)
+    def benchmark(*args):
+        raise AssertionError('stored result not used')
+    tuner.benchmark = benchmark
+    assert tuner.choose(x, w, b, conv_param) == method
+
+
+def test_tuner_retunes_unknown_methods(tmpdir):
+    filename = str(tmpdir.join('tuning.json'))
+    x, w, b, conv_param = conv_inputs()
+    key = ConvAutoTuner.key(x, w, conv_param)
+    with open(filename, 'w') as f:
+        json.dump({key: {'method': 'removed'}, 'other': 'malformed'}, f)
+    tuner = ConvAutoTuner(filename, repeats=1)
+    assert tuner.choose(x, w, b, conv_param) in fast_layers._conv_methods
+    with open(filename) as f:
+        assert list(json.load(f)) == [key]
+
+
+def test_tuner_failed_write_leaves_no_temporary_file(tmpdir, monkeypatch):
+    filename = str(tmpdir.join('tuning.json'))
+    x, w, b, conv_param = conv_inputs()
+    def rename(src, dst):
+        raise OSError('rename failed')
+    monkeypatch.setattr(os, 'rename', rename)
+    with pytest.raises(OSError):
+        ConvAutoTuner(filename, repeats=1).choose(x, w, b, conv_param)
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_auto_method_matches_default(monkeypatch):
+    monkeypatch.setattr(fast_layers, 'conv_tuner', ConvAutoTuner(repeats=1))
+    x, w, b, conv_param = conv_inputs()
+    out, cache = conv_forward_fast(x, w, b, conv_param)
+    out_auto, cache_auto = conv_forward_fast(
+        x, w, b, dict(conv_param, method='auto'))
+    assert np.allclose(out, out_auto)
+    dout = np.random.RandomState(1).randn(*out.shape)
+    for g, g_auto in zip(conv_backward_fast(dout, cache),
+                         conv_backward_fast(dout, cache_auto)):
+        assert np.allclose(g, g_auto)
+
+
+def max_pool_loops(x, pool_height, pool_width, stride, pad, dout):
+    """
+    Max pooling by explicit loops over the windows; the gradient of a window
+    goes to the first position of its max, in row-major order.
+    """
+    N, C, H, W = x.shape
+    out_height = (H + 2 * pad - pool_height) // stride + 1
+    out_width = (W + 2 * pad - pool_width) // stride + 1
+    out = np.zeros((N, C, out_height, out_width), dtype=x.dtype)
+    dx = np.zeros(x.shape)
+    for n in range(N):
+        for c in range(C):
+            for yy in range(out_height):
+                for xx in range(out_width):
+                    best = None
+                    for ii in range(pool_height):
+                        for jj in range(pool_width):
+                            y = yy * stride + ii - pad
+                            x_ = xx * stride + jj - pad
+                            if not (0 <= y < H and 0 <= x_ < W):
+                                continue
+                            if best is None or x[n, c, y, x_] > x[best]:
+                                best = (n, c, y, x_)
+                    out[n, c, yy, xx] = x[best]
+                    dx[best] += dout[n, c, yy, xx]
+    return out, dx
+
+
+POOLS = [
+    # (x shape, pool height, pool width, stride, pad)
+    ((2, 3, 8, 8), 2, 2, 2, 0),
+    ((2, 3, 7, 7), 3, 3, 2, 0),
+    ((2, 2, 5, 5), 2, 2, 1, 0),
+    ((1, 2, 5, 6), 2, 3, 1, 0),
+    ((2, 2, 9, 9), 3, 3, 2, 1),
+    ((1, 3, 6, 6), 2, 2, 2, 1),
+    ((1, 1, 4, 4), 3, 3, 1, 1),
+]
+
+
+def pool_inputs(shape, pool_height, pool_width, stride, pad, dtype):
+    rng = np.random.RandomState(0)
+    if np.issubdtype(dtype, np.integer):
+        # few distinct values, so windows have ties
+        x = rng.randint(-4, 0, size=shape).astype(dtype)
+    else:
+        # all negative, so a zero-padded pixel would win the max
+        x = (rng.randn(*shape) - 10).astype(dtype)
+    pool_param = {'pool_height': pool_height, 'pool_width': pool_width,
+                  'stride': stride}
+    if pad:
+        pool_param['pad'] = pad
+    return x, pool_param, rng
+
+
+@pytest.mark.parametrize('shape, pool_height, pool_width, stride, pad', POOLS)
+@pytest.mark.parametrize('dtype', [np.float64, np.float32, np.int64, np.int8])
+def test_max_pool_strides_matches_loops(shape, pool_height, pool_width, stride,
+                                        pad, dtype):
+    x, pool_param, rng = pool_inputs(shape, pool_height, pool_width, stride,
+                                     pad, dtype)
+    out, cache = max_pool_forward_strides(x, pool_param)
+    dout = rng.randn(*out.shape)
+    out_ref, dx_ref = max_pool_loops(x, pool_height, pool_width, stride, pad,
+                                     dout)
+    assert out.dtype == dtype
+    assert np.array_equal(out, out_ref)
+    dx = max_pool_backward_strides(dout, cache)
+    assert dx.shape == x.shape
+    assert np.allclose(dx, dx_ref)
+
+
+@pytest.mark.parametrize('shape, pool_height, pool_width, stride, pad', POOLS)
+def test_max_pool_fast_matches_loops(shape, pool_height, pool_width, stride,
+                                     pad):
+    x, pool_param, rng = pool_inputs(shape, pool_height, pool_width, stride,
+                                     pad, np.float64)
+    out, cache = max_pool_forward_fast(x, pool_param)
+    dout = rng.randn(*out.shape)
+    out_ref, dx_ref = max_pool_loops(x, pool_height, pool_width, stride, pad,
+                                     dout)
+    assert np.array_equal(out, out_ref)
+    assert np.allclose(max_pool_backward_fast(dout, cache), dx_ref)
+
+
+def test_max_pool_chooses_reshape_only_for_tiling_pools():
+    x = np.random.RandomState(0).randn(1, 1, 6, 6)
+    for pool_param, method in [
+            ({'pool_height': 2, 'pool_width': 2, 'stride': 2}, 'reshape'),
+            ({'pool_height': 2, 'pool_width': 2, 'stride': 2, 'pad': 1},
+             'strides'),
+            ({'pool_height': 2, 'pool_width': 2, 'stride': 1}, 'strides'),
+            ({'pool_height': 3, 'pool_width': 3, 'stride': 3}, 'reshape')]:
+        assert max_pool_forward_fast(x, pool_param)[1][0] == method
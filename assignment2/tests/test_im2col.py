@@ -0,0 +1,173 @@
+import collections
+import importlib
+import warnings
+
+import numpy as np
+import pytest
+
+from cs231n import fast_layers, im2col
+from cs231n.fast_layers import conv_forward_im2col, conv_backward_im2col
+from cs231n.im2col import (col2im_indices, get_im2col_indices, im2col_indices,
+                           im2col_numpy, col2im_numpy, col2im_6d_numpy)
+
+
+def im2col_loops(x, k, pad, stride):
+    """ Loop port of im2col_cython for square fields """
+    N, C, H, W = x.shape
+    out_h = (H + 2 * pad - k) // stride + 1
+    out_w = (W + 2 * pad - k) // stride + 1
+    x_padded = np.pad(x, ((0, 0), (0, 0), (pad, pad), (pad, pad)),
+                      mode='constant')
+    cols = np.zeros((C * k * k, N * out_h * out_w), dtype=x.dtype)
+    for c in range(C):
+        for ii in range(k):
+            for jj in range(k):
+                row = c * k * k + ii * k + jj
+                for yy in range(out_h):
+                    for xx in range(out_w):
+                        for i in range(N):
+                            col = yy * out_w * N + xx * N + i
+                            cols[row, col] = x_padded[
+                                i, c, stride * yy + ii, stride * xx + jj]
+    return cols
+
+
+def col2im_6d_loops(cols, N, C, H, W, k, pad, stride):
+    """ Loop port of col2im_6d_cython; cols has shape (C, k, k, N, h, w) """
+    out_h, out_w = cols.shape[4:]
+    x_padded = np.zeros((N, C, H + 2 * pad, W + 2 * pad), dtype=cols.dtype)
+    for c in range(C):
+        for ii in range(k):
+            for jj in range(k):
+                for i in range(N):
+                    for yy in range(out_h):
+                        for xx in range(out_w):
+                            x_padded[i, c, stride * yy + ii,
+                                     stride * xx + jj] += cols[c, ii, jj, i,
+                                                               yy, xx]
+    return x_padded[:, :, pad:pad + H, pad:pad + W]
+
+
+SHAPES = [
+    # (N, C, H, W, field size, pad, stride)
+    (2, 3, 5, 5, 3, 1, 1),
+    (3, 2, 7, 6, 3, 0, 2),
+    (1, 2, 8, 8, 2, 0, 2),
+    (2, 1, 6, 7, 3, 2, 3),
+]
+
+
+@pytest.mark.parametrize('shape', SHAPES)
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_numpy_kernels_match_loops(shape, dtype):
+    N, C, H, W, k, pad, stride = shape
+    rng = np.random.RandomState(0)
+    x = rng.randn(N, C, H, W).astype(dtype)
+    cols = im2col_numpy(x, k, k, pad, stride)
+    assert cols.dtype == dtype
+    assert np.array_equal(cols, im2col_loops(x, k, pad, stride))
+
+    cols = rng.randn(*cols.shape).astype(dtype)
+    out_h = (H + 2 * pad - k) // stride + 1
+    out_w = (W + 2 * pad - k) // stride + 1
+    cols_6d = cols.reshape(C, k, k, N, out_h, out_w)
+    expected = col2im_6d_loops(cols_6d, N, C, H, W, k, pad, stride)
+    rtol = 1e-5 if dtype == np.float32 else 1e-12
+    dx = col2im_6d_numpy(cols_6d, N, C, H, W, k, k, pad, stride)
+    assert dx.dtype == dtype and np.allclose(dx, expected, rtol=rtol)
+    # the 2D columns hold (yy, xx, i) in that order instead of (i, yy, xx)
+    cols_2d = cols_6d.transpose(0, 1, 2, 4, 5, 3).reshape(cols.shape)
+    dx = col2im_numpy(cols_2d, N, C, H, W, k, k, pad, stride)
+    assert dx.dtype == dtype and np.allclose(dx, expected, rtol=rtol)
+
+
+def conv_loops(x, w, b, stride, pad):
+    N, C, H, W = x.shape
+    F, _, HH, WW = w.shape
+    x_padded = np.pad(x, ((0, 0), (0, 0), (pad, pad), (pad, pad)),
+                      mode='constant')
+    out_h = (H + 2 * pad - HH) // stride + 1
+    out_w = (W + 2 * pad - WW) // stride + 1
+    out = np.zeros((N, F, out_h, out_w))
+    for i in range(N):
+        for f in range(F):
+            for yy in range(out_h):
+                for xx in range(out_w):
+                    window = x_padded[i, :, yy * stride:yy * stride + HH,
+                                      xx * stride:xx * stride + WW]
+                    out[i, f, yy, xx] = np.sum(window * w[f]) + b[f]
+    return out
+
+
+@pytest.mark.parametrize('stride, pad', [(1, 1), (2, 0), (2, 1)])
+def test_im2col_convolution_matches_loops(stride, pad):
+    rng = np.random.RandomState(1)
+    x = rng.randn(2, 3, 7, 7)
+    w = rng.randn(4, 3, 3, 3)
+    b = rng.randn(4)
+    conv_param = {'stride': stride, 'pad': pad}
+    out, cache = conv_forward_im2col(x, w, b, conv_param)
+    assert np.allclose(out, conv_loops(x, w, b, stride, pad))
+
+    # the backward pass is the adjoint of the forward pass, which is linear
+    # in x and in w separately
+    dout = rng.randn(*out.shape)
+    dx, dw, db = conv_backward_im2col(dout, cache)
+    dx_in, dw_in, zero = rng.randn(*x.shape), rng.randn(*w.shape), 0 * b
+    assert np.isclose(np.sum(dout * conv_loops(dx_in, w, zero, stride, pad)),
+                      np.sum(dx * dx_in))
+    assert np.isclose(np.sum(dout * conv_loops(x, dw_in, zero, stride, pad)),
+                      np.sum(dw * dw_in))
+    assert np.allclose(db, dout.sum(axis=(0, 2, 3)))
+
+
+def test_fallback_warns_once_and_uses_numpy():
+    try:
+        import cs231n.im2col_cython
+    except ImportError:
+        pass
+    else:
+        pytest.skip('the im2col_cython extension is built')
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        module = importlib.reload(fast_layers)
+    assert [w.category for w in caught] == [RuntimeWarning]
+    assert module.im2col_cython is im2col_numpy
+    assert module.col2im_cython is col2im_numpy
+    assert module.col2im_6d_cython is col2im_6d_numpy
+
+
+def test_index_tables_are_memoized(monkeypatch):
+    monkeypatch.setattr(im2col, '_index_cache', collections.OrderedDict())
+    monkeypatch.setattr(im2col, 'INDEX_CACHE_SIZE', 2)
+    k, i, j = get_im2col_indices((2, 3, 5, 5), 3, 3, 1, 1)
+    assert i.shape == j.shape == (3 * 3 * 3, 5 * 5)
+    assert k.shape == (3 * 3 * 3, 1)
+    for a in (k, i, j):
+        assert not a.flags.writeable
+    # a list shape hits the same entry
+    tables = get_im2col_indices([2, 3, 5, 5], 3, 3, 1, 1)
+    assert all(a is b for a, b in zip(tables, (k, i, j)))
+
+    # the least recently used table is evicted first
+    get_im2col_indices((2, 3, 6, 6), 2, 2, 0, 2)
+    get_im2col_indices((2, 3, 5, 5), 3, 3, 1, 1)
+    get_im2col_indices((1, 1, 4, 4), 2, 2, 0, 2)
+    assert list(im2col._index_cache) == [((2, 3, 5, 5), 3, 3, 1, 1),
+                                         ((1, 1, 4, 4), 2, 2, 0, 2)]
+    assert get_im2col_indices((2, 3, 5, 5), 3, 3, 1, 1)[1] is i
+
+
+@pytest.mark.parametrize('shape', [s for s in SHAPES
+                                   if (s[2] + 2 * s[5] - s[4]) % s[6] == 0
+                                   and (s[3] + 2 * s[5] - s[4]) % s[6] == 0])
+def test_index_kernels_match_numpy(shape):
+    N, C, H, W, k, pad, stride = shape
+    rng = np.random.RandomState(2)
+    x = rng.randn(N, C, H, W)
+    for _ in range(2):
+        cols = im2col_indices(x, k, k, pad, stride)
+        assert np.array_equal(cols, im2col_loops(x, k, pad, stride))
+    dcols = rng.randn(*cols.shape)
+    assert np.allclose(col2im_indices(dcols, x.shape, k, k, pad, stride),
+                       col2im_numpy(dcols, N, C, H, W, k, k, pad, stride))
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+im2col_cython = pytest.importorskip('cs231n.im2col_cython')
+from cs231n.im2col import im2col_numpy, col2im_numpy, col2im_6d_numpy
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_read_only_inputs(dtype):
+    N, C, H, W, k, pad, stride = 3, 2, 7, 7, 3, 1, 1
+    x = np.random.randn(N, C, H, W).astype(dtype)
+    x.flags.writeable = False
+    cols = im2col_cython.im2col_cython(x, k, k, pad, stride)
+    assert np.array_equal(cols, im2col_numpy(x, k, k, pad, stride))
+
+    cols.flags.writeable = False
+    dx = im2col_cython.col2im_cython(cols, N, C, H, W, k, k, pad, stride)
+    assert np.allclose(dx, col2im_numpy(cols, N, C, H, W, k, k, pad, stride))
+
+    cols_6d = np.random.randn(C, k, k, N, H, W).astype(dtype)
+    cols_6d.flags.writeable = False
+    dx = im2col_cython.col2im_6d_cython(cols_6d, N, C, H, W, k, k, pad, stride)
+    assert np.allclose(
+        dx, col2im_6d_numpy(cols_6d, N, C, H, W, k, k, pad, stride))
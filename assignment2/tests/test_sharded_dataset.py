@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from cs231n.sharded_dataset import ShardedDataset, write_sharded_dataset
+
+
+@pytest.fixture
+def dataset(tmpdir):
+    X = np.arange(10 * 3, dtype=np.float32).reshape(10, 3)
+    y = np.arange(10)
+    write_sharded_dataset(str(tmpdir), {'X': X, 'y': y}, shard_size=4)
+    return ShardedDataset(str(tmpdir))
+
+
+def test_sampler_covers_epoch(dataset):
+    sampler = dataset.sampler(5, seed=0)
+    batches = [next(sampler) for _ in range(2)]
+    assert sorted(np.concatenate(batches)) == list(range(10))
+
+
+@pytest.mark.parametrize('batch_size', [0, 11, 20])
+def test_sampler_rejects_invalid_batch_size(dataset, batch_size):
+    with pytest.raises(ValueError):
+        dataset.sampler(batch_size)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from cs231n import optim
+from cs231n.layers import softmax_loss
+from cs231n.solver import Solver, load_checkpoint
+
+
+class LinearModel(object):
+    def __init__(self):
+        self.params = {'W': np.zeros((4, 3))}
+
+    def loss(self, X, y=None):
+        scores = X.dot(self.params['W'])
+        if y is None:
+            return scores
+        loss, dscores = softmax_loss(scores, y)
+        return loss, {'W': X.T.dot(dscores)}
+
+
+@pytest.mark.parametrize('checkpoint_format', ['bundle', 'pickle'])
+def test_checkpoint_round_trip_with_adam_state(tmpdir, checkpoint_format):
+    rng = np.random.RandomState(0)
+    data = {'X_train': rng.randn(10, 4), 'y_train': rng.randint(3, size=10),
+            'X_val': rng.randn(5, 4), 'y_val': rng.randint(3, size=5)}
+    # resume from the Adam state of an earlier run
+    optim_config = {'learning_rate': np.float32(1e-2),
+                    'beta1': np.float64(0.9), 't': np.int64(7),
+                    'm': rng.randn(4, 3), 'v': rng.rand(4, 3)}
+    solver = Solver(LinearModel(), data, update_rule='adam',
+                    optim_config=dict(optim_config), lr_decay=np.float32(0.5),
+                    num_epochs=1, batch_size=5, verbose=False,
+                    checkpoint_name=str(tmpdir.join('model')),
+                    checkpoint_format=checkpoint_format)
+    solver.train()
+
+    ext = '.bin' if checkpoint_format == 'bundle' else '.pkl'
+    checkpoint = load_checkpoint(str(tmpdir.join('model_epoch_1' + ext)))
+    assert checkpoint['update_rule'] is optim.adam
+    assert checkpoint['epoch'] == 1
+    assert checkpoint['lr_decay'] == pytest.approx(0.5)
+    assert sorted(checkpoint['optim_config']) == sorted(optim_config)
+    for k, v in optim_config.items():
+        assert np.array_equal(checkpoint['optim_config'][k], v)
+    W = checkpoint['model'].params['W']
+    assert W.shape == (4, 3) and np.any(W != 0)
+    assert len(checkpoint['loss_history']) == 2
@@ -5,6 +5,7 @@ import numpy as np
 
 from cs231n import optim
 from cs231n.coco_utils import sample_coco_minibatch
+from cs231n.data_loader import DataLoader
 
 
 class CaptioningSolver(object):
@@ -70,7 +71,9 @@ class CaptioningSolver(object):
 
         Required arguments:
         - model: A model object conforming to the API described above
-        - data: A dictionary of training and validation data from load_coco_data
+        - data: A dictionary of training and validation data from load_coco_data,
+          or a CocoDataLoader built on it; minibatches are then prepared on
+          background threads, and the batch_size of the loader is used.
 
         Optional arguments:
         - update_rule: A string giving the name of an update rule in optim.py.
@@ -90,6 +93,10 @@ class CaptioningSolver(object):
           training.
         """
         self.model = model
+        self.loader = None
+        if isinstance(data, DataLoader):
+            self.loader = data
+            data = data.data
         self.data = data
 
         # Unpack keyword arguments
@@ -101,6 +108,8 @@ class CaptioningSolver(object):
 
         self.print_every = kwargs.pop('print_every', 10)
         self.verbose = kwargs.pop('verbose', True)
+        if self.loader is not None:
+            self.batch_size = self.loader.batch_size
 
         # Throw an error if there are extra keyword arguments
         if len(kwargs) > 0:
@@ -142,9 +151,12 @@ class CaptioningSolver(object):
         be called manually.
         """
         # Make a minibatch of training data
-        minibatch = sample_coco_minibatch(self.data,
-                      batch_size=self.batch_size,
-                      split='train')
+        if self.loader is not None:
+            minibatch = self.loader.next()
+        else:
+            minibatch = sample_coco_minibatch(self.data,
+                          batch_size=self.batch_size,
+                          split='train')
         captions, features, urls = minibatch
 
         # Compute loss and gradient
@@ -211,6 +223,20 @@ class CaptioningSolver(object):
         iterations_per_epoch = max(num_train // self.batch_size, 1)
         num_iterations = self.num_epochs * iterations_per_epoch
 
+        try:
+            self._train(num_iterations, iterations_per_epoch)
+        finally:
+            if self.loader is not None:
+                self.loader.close()
+
+        # At the end of training swap the best params into the model
+        # self.model.params = self.best_params
+
+
+    def _train(self, num_iterations, iterations_per_epoch):
+        """
+        Run the optimization loop of train(). Don't call this manually.
+        """
         for t in range(num_iterations):
             self._step()
 
@@ -230,6 +256,3 @@ class CaptioningSolver(object):
             # Check train and val accuracy on the first iteration, the last
             # iteration, and at the end of each epoch.
             # TODO: Implement some logic to check Bleu on validation set periodically
-
-        # At the end of training swap the best params into the model
-        # self.model.params = self.best_params
@@ -3,6 +3,8 @@ import os, json
 import numpy as np
 import h5py
 
+from cs231n.data_loader import DataLoader
+
 BASE_DIR = 'cs231n/datasets/coco_captioning'
 
 def load_coco_data(base_dir=BASE_DIR,
@@ -83,3 +85,39 @@ def sample_coco_minibatch(data, batch_size=100, split='train'):
     image_features = data['%s_features' % split][image_idxs]
     urls = data['%s_urls' % split][image_idxs]
     return captions, image_features, urls
+
+
+class CocoDataLoader(DataLoader):
+    """
+    A DataLoader producing the same (captions, image_features, urls)
+    minibatches as sample_coco_minibatch, prepared on background threads.
+    See DataLoader for the available options, except augment: the image
+    augmentations of DataLoader work on image batches, and neither the
+    captions nor the feature vectors are images.
+    """
+
+    def __init__(self, data, batch_size=100, split='train', **kwargs):
+        if kwargs.get('augment'):
+            raise ValueError('CocoDataLoader does not support augment')
+        super(CocoDataLoader, self).__init__(
+            data, batch_size=batch_size, split=split,
+            keys=('%s_captions', '%s_image_idxs'), **kwargs)
+        self.features = data['%s_features' % split]
+        self.urls = data['%s_urls' % split]
+
+
+    def _allocate(self):
+        captions, image_idxs = self.arrays
+        return [np.empty((self.batch_size,) + captions.shape[1:],
+                         dtype=captions.dtype),
+                np.empty((self.batch_size,) + self.features.shape[1:],
+                         dtype=self.dtype or self.features.dtype),
+                np.empty(self.batch_size, dtype=self.urls.dtype)]
+
+
+    def _gather(self, idx, slot):
+        captions, image_idxs = self.arrays
+        np.take(captions, idx, axis=0, out=slot[0])
+        image_idxs = image_idxs[idx]
+        slot[1][...] = self.features[image_idxs]
+        slot[2][...] = self.urls[image_idxs]
@@ -1,12 +1,19 @@
 from __future__ import print_function
+import warnings
+
 import numpy as np
 try:
     from cs231n.im2col_cython import col2im_cython, im2col_cython
     from cs231n.im2col_cython import col2im_6d_cython
 except ImportError:
-    print('run the following from the cs231n directory and try again:')
-    print('python setup.py build_ext --inplace')
-    print('You may also need to restart your iPython kernel')
+    warnings.warn(
+        'The im2col_cython extension is not built; falling back to the NumPy '
+        'implementations in cs231n.im2col. To build it, run the '
+        'following from the cs231n directory and restart your iPython '
+        'kernel:\npython setup.py build_ext --inplace', RuntimeWarning)
+    from cs231n.im2col import im2col_numpy as im2col_cython
+    from cs231n.im2col import col2im_numpy as col2im_cython
+    from cs231n.im2col import col2im_6d_numpy as col2im_6d_cython
 
 from cs231n.im2col import *
 
@@ -240,7 +247,7 @@ def max_pool_forward_im2col(x, pool_param):
     out_width = (W - pool_width) // stride + 1
 
     x_split = x.reshape(N * C, 1, H, W)
-    x_cols = im2col(x_split, pool_height, pool_width, padding=0, stride=stride)
+    x_cols = im2col_indices(x_split, pool_height, pool_width, padding=0, stride=stride)
     x_cols_argmax = np.argmax(x_cols, axis=0)
     x_cols_max = x_cols[x_cols_argmax, np.arange(x_cols.shape[1])]
     out = x_cols_max.reshape(out_height, out_width, N, C).transpose(2, 3, 0, 1)
@@ -1,14 +1,33 @@
 from builtins import range
+import collections
+
 import numpy as np
 
 
+# Index tables of get_im2col_indices, most recently used last
+_index_cache = collections.OrderedDict()
+INDEX_CACHE_SIZE = 32
+
+
 def get_im2col_indices(x_shape, field_height, field_width, padding=1, stride=1):
+    """
+    Return the fancy-index arrays (k, i, j) used by im2col_indices and
+    col2im_indices. They only depend on the arguments, so they are computed
+    once per (x_shape, field_height, field_width, padding, stride) and kept
+    in a small LRU cache; the arrays are read-only since they are shared.
+    """
+    key = (tuple(x_shape), field_height, field_width, padding, stride)
+    entry = _index_cache.pop(key, None)
+    if entry is not None:
+        _index_cache[key] = entry
+        return entry
+
     # First figure out what the size of the output should be
     N, C, H, W = x_shape
     assert (H + 2 * padding - field_height) % stride == 0
-    assert (W + 2 * padding - field_height) % stride == 0
-    out_height = (H + 2 * padding - field_height) / stride + 1
-    out_width = (W + 2 * padding - field_width) / stride + 1
+    assert (W + 2 * padding - field_width) % stride == 0
+    out_height = (H + 2 * padding - field_height) // stride + 1
+    out_width = (W + 2 * padding - field_width) // stride + 1
 
     i0 = np.repeat(np.arange(field_height), field_width)
     i0 = np.tile(i0, C)
@@ -20,6 +39,11 @@ def get_im2col_indices(x_shape, field_height, field_width, padding=1, stride=1):
 
     k = np.repeat(np.arange(C), field_height * field_width).reshape(-1, 1)
 
+    for a in (k, i, j):
+        a.flags.writeable = False
+    _index_cache[key] = (k, i, j)
+    while len(_index_cache) > INDEX_CACHE_SIZE:
+        _index_cache.popitem(last=False)
     return (k, i, j)
 
 
@@ -53,4 +77,87 @@ def col2im_indices(cols, x_shape, field_height=3, field_width=3, padding=1,
         return x_padded
     return x_padded[:, :, padding:-padding, padding:-padding]
 
-pass
+
+# Pure NumPy versions of the functions in im2col_cython.pyx with the same
+# signatures and results. fast_layers uses them when the Cython extension is
+# not built. im2col is a single copy through a strided view; the col2im
+# functions scatter with one strided slice-add per filter offset, which sums
+# overlapping windows correctly without a Python loop over pixels.
+
+def _padded_windows(x_padded, field_height, field_width, out_height,
+                    out_width, stride):
+    """
+    Strided view of shape (C, field_height, field_width, out_height,
+    out_width, N) of the windows of a padded input of shape (N, C, H, W).
+    """
+    N, C, H, W = x_padded.shape
+    s0, s1, s2, s3 = x_padded.strides
+    return np.lib.stride_tricks.as_strided(
+        x_padded,
+        shape=(C, field_height, field_width, out_height, out_width, N),
+        strides=(s1, s2, s3, stride * s2, stride * s3, s0),
+        writeable=False)
+
+
+def im2col_numpy(x, field_height, field_width, padding, stride):
+    """
+    NumPy version of im2col_cython. Returns cols of shape
+    (C * field_height * field_width, out_height * out_width * N).
+    """
+    N, C, H, W = x.shape
+    out_height = (H + 2 * padding - field_height) // stride + 1
+    out_width = (W + 2 * padding - field_width) // stride + 1
+    p = padding
+    x_padded = np.pad(x, ((0, 0), (0, 0), (p, p), (p, p)), mode='constant')
+    windows = _padded_windows(x_padded, field_height, field_width,
+                              out_height, out_width, stride)
+    cols = np.ascontiguousarray(windows)
+    return cols.reshape(C * field_height * field_width, -1)
+
+
+def _scatter_windows(x_padded, cols, out_height, out_width, stride):
+    """
+    x_padded[n, c, stride * h + i, stride * w + j] += cols[c, i, j, n, h, w]
+    for a cols view of shape (C, field_height, field_width, N, out_height,
+    out_width).
+    """
+    _, field_height, field_width = cols.shape[:3]
+    for i in range(field_height):
+        for j in range(field_width):
+            x_padded[:, :, i:i + stride * out_height:stride,
+                     j:j + stride * out_width:stride] += \
+                cols[:, i, j].transpose(1, 0, 2, 3)
+    return x_padded
+
+
+def col2im_numpy(cols, N, C, H, W, field_height, field_width, padding,
+                 stride):
+    """
+    NumPy version of col2im_cython; cols is laid out as returned by
+    im2col_numpy.
+    """
+    out_height = (H + 2 * padding - field_height) // stride + 1
+    out_width = (W + 2 * padding - field_width) // stride + 1
+    x_padded = np.zeros((N, C, H + 2 * padding, W + 2 * padding),
+                        dtype=cols.dtype)
+    cols = cols.reshape(C, field_height, field_width, out_height, out_width, N)
+    _scatter_windows(x_padded, cols.transpose(0, 1, 2, 5, 3, 4),
+                     out_height, out_width, stride)
+    if padding > 0:
+        return x_padded[:, :, padding:-padding, padding:-padding]
+    return x_padded
+
+
+def col2im_6d_numpy(cols, N, C, H, W, HH, WW, pad, stride):
+    """
+    NumPy version of col2im_6d_cython; cols has shape
+    (C, HH, WW, N, out_h, out_w) as in conv_backward_strides.
+    """
+    out_h = (H + 2 * pad - HH) // stride + 1
+    out_w = (W + 2 * pad - WW) // stride + 1
+    x_padded = np.zeros((N, C, H + 2 * pad, W + 2 * pad), dtype=cols.dtype)
+    cols = cols.reshape(C, HH, WW, N, out_h, out_w)
+    _scatter_windows(x_padded, cols, out_h, out_w, stride)
+    if pad > 0:
+        return x_padded[:, :, pad:-pad, pad:-pad]
+    return x_padded
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('h5py')
+from cs231n.coco_utils import CocoDataLoader
+from cs231n.data_loader import random_flip, random_crop
+
+
+def make_data(num_captions=20, num_images=5, T=7, D=4):
+    rng = np.random.RandomState(0)
+    return {
+      'train_captions': rng.randint(0, 100, size=(num_captions, T)),
+      'train_image_idxs': rng.randint(0, num_images, size=num_captions),
+      'train_features': rng.randn(num_images, D).astype(np.float32),
+      'train_urls': np.array(['url%d' % i for i in range(num_images)]),
+    }
+
+
+def test_batches_match_data():
+    data = make_data()
+    order = [np.arange(5), np.arange(5, 10)]
+    loader = CocoDataLoader(data, batch_size=5, sampler=iter(order))
+    try:
+        for idx in order:
+            captions, features, urls = loader.next()
+            assert np.array_equal(captions, data['train_captions'][idx])
+            image_idxs = data['train_image_idxs'][idx]
+            assert np.array_equal(features,
+                                  data['train_features'][image_idxs])
+            assert np.array_equal(urls, data['train_urls'][image_idxs])
+    finally:
+        loader.close()
+
+
+@pytest.mark.parametrize('augment', [random_flip, [random_flip, random_crop]])
+def test_augment_is_rejected(augment):
+    data = make_data()
+    captions = data['train_captions'].copy()
+    with pytest.raises(ValueError):
+        CocoDataLoader(data, batch_size=5, augment=augment)
+    assert np.array_equal(data['train_captions'], captions)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from cs231n.fast_layers import (conv_forward_fast, conv_backward_fast,
+                                conv_forward_im2col, conv_backward_im2col)
+
+
+def conv_reference(x, w, b, stride, pad):
+    N, C, H, W = x.shape
+    F, _, HH, WW = w.shape
+    xp = np.pad(x, ((0, 0), (0, 0), (pad, pad), (pad, pad)), mode='constant')
+    out_h = (H + 2 * pad - HH) // stride + 1
+    out_w = (W + 2 * pad - WW) // stride + 1
+    out = np.zeros((N, F, out_h, out_w))
+    for i in range(out_h):
+        for j in range(out_w):
+            window = xp[:, :, i * stride:i * stride + HH,
+                        j * stride:j * stride + WW]
+            out[:, :, i, j] = np.tensordot(window, w,
+                                           axes=([1, 2, 3], [1, 2, 3])) + b
+    return out
+
+
+@pytest.mark.parametrize('forward, backward', [
+    (conv_forward_fast, conv_backward_fast),
+    (conv_forward_im2col, conv_backward_im2col)])
+@pytest.mark.parametrize('stride, pad', [(1, 1), (2, 1), (1, 0)])
+def test_conv_matches_reference(forward, backward, stride, pad):
+    rng = np.random.RandomState(0)
+    x = rng.randn(2, 3, 7, 7)
+    w = rng.randn(4, 3, 3, 3)
+    b = rng.randn(4)
+    conv_param = {'stride': stride, 'pad': pad}
+    out, cache = forward(x, w, b, conv_param)
+    assert np.allclose(out, conv_reference(x, w, b, stride, pad))
+
+    # the reference is linear in x, w and b, so a random projection of its
+    # output checks the gradients
+    dout = rng.randn(*out.shape)
+    dx, dw, db = backward(dout, cache)
+    h = 1e-6
+    for param, grad in [(x, dx), (w, dw), (b, db)]:
+        direction = rng.randn(*param.shape)
+        param += h * direction
+        plus = np.sum(conv_reference(x, w, b, stride, pad) * dout)
+        param -= 2 * h * direction
+        minus = np.sum(conv_reference(x, w, b, stride, pad) * dout)
+        param += h * direction
+        assert np.isclose((plus - minus) / (2 * h), np.sum(grad * direction))